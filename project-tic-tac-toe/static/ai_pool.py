@@ -0,0 +1,96 @@
+"""Runs AI move searches off the event loop in a pool of worker processes."""
+import asyncio
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import board_from_rows, find_best_move
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_SLACK = 0.5  # seconds allowed on top of the search budget for queueing and IPC
+MAX_PENDING_PER_SID = 1  # requests one client may have queued or running
+
+
+class AIPoolBusy(Exception):
+    """Raised when too many AI requests are already queued"""
+
+
+def compute_move(rows, symbol, time_limit, deadline):
+    """Worker entry point; skips the search if the request expired while queued"""
+    remaining = min(time_limit, deadline - time.time())
+    if remaining <= 0:
+        return None
+    return find_best_move(board_from_rows(rows), symbol, remaining)
+
+
+class AIWorkerPool:
+    """Bounded front end to an executor that computes AI moves.
+
+    Defaults to a ProcessPoolExecutor with one worker per core; any
+    concurrent.futures executor can be plugged in instead. At most
+    ``max_pending`` requests may be queued or running at once, and at most
+    ``max_per_sid`` of them for one client, so a client flooding requests
+    is the one turned away; further requests are rejected with AIPoolBusy.
+    Requests are tracked per sid so a disconnect can cancel them.
+    """
+
+    def __init__(self, executor=None, max_workers=None, max_pending=None, max_per_sid=MAX_PENDING_PER_SID):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self.max_per_sid = max_per_sid
+        self.executor = executor
+        self.pending = {}  # {sid: set of futures}
+        self.pending_count = 0
+        self.cancelled = set()  # futures cancelled by a disconnect rather than by the caller
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            logger.info(f"AI worker pool started with {self.max_workers} processes")
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def request_move(self, sid, rows, symbol, time_limit):
+        """Search a move for sid; returns the engine result, or None if the deadline passed"""
+        if not math.isfinite(time_limit) or time_limit <= 0:
+            raise ValueError(f'Invalid time limit {time_limit!r}')
+        if len(self.pending.get(sid, ())) >= self.max_per_sid:
+            raise AIPoolBusy('An AI move is already being computed')
+        if self.pending_count >= self.max_pending:
+            raise AIPoolBusy('AI is busy, try again')
+        self.start()
+
+        deadline = time.time() + time_limit + DEADLINE_SLACK
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, compute_move, rows, symbol, time_limit, deadline)
+
+        self.pending.setdefault(sid, set()).add(future)
+        self.pending_count += 1
+        try:
+            return await asyncio.wait_for(future, timeout=deadline - time.time())
+        except asyncio.TimeoutError:
+            return None
+        except asyncio.CancelledError:
+            if future not in self.cancelled:
+                raise
+            return None
+        finally:
+            self.cancelled.discard(future)
+            self.pending_count -= 1
+            futures = self.pending.get(sid)
+            if futures is not None:
+                futures.discard(future)
+                if not futures:
+                    del self.pending[sid]
+
+    def cancel(self, sid):
+        """Cancel every queued request of a disconnected client"""
+        for future in self.pending.pop(sid, ()):
+            self.cancelled.add(future)
+            future.cancel()
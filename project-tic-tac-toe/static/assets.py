@@ -0,0 +1,170 @@
+"""In-memory static asset cache: precompressed bodies, content-hash ETags and conditional GETs.
+
+Every servable file under the root is read once at startup. Text assets are
+also stored gzip-compressed (and brotli-compressed when the ``brotli``
+package is installed); images are already compressed and kept as they are.
+Local ``src``/``href`` references in HTML pages are rewritten to
+``path?v=<hash>``, and a request carrying the current hash is cached by the
+browser for a year. Pages and unversioned URLs are revalidated on every load,
+which costs a 304 with no body while the file is unchanged.
+
+Only files with an extension in CONTENT_TYPES are served, so the server's
+own sources, journals and results files never are. Edits show up after a
+restart (or ``AssetCache.load``).
+"""
+import gzip
+import hashlib
+import logging
+import os
+import posixpath
+import re
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'text/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml',
+    '.gif': 'image/gif',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.ico': 'image/x-icon',
+    '.webp': 'image/webp',
+    '.woff2': 'font/woff2',
+}
+COMPRESSIBLE = {'.html', '.js', '.css', '.json', '.svg'}
+MIN_SAVING = 0.1  # keep a compressed copy only if it is at least this much smaller
+INDEX = 'index.html'
+IMMUTABLE = 'public, max-age=31536000, immutable'  # versioned URLs never change
+REVALIDATE = 'no-cache'  # cached, but checked against the ETag before each use
+
+# src="..." / href="..." in pages; absolute URLs, anchors and data: URIs are left alone
+REFERENCE = re.compile(r'''\b(src|href)=(["'])(?![a-z][a-z0-9+.-]*:|//|#)([^"'?#]+)\2''', re.IGNORECASE)
+
+
+class Asset:
+    __slots__ = ('content_type', 'digest', 'bodies')
+
+    def __init__(self, content_type, body, compressible):
+        self.content_type = content_type
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.bodies = {'identity': body}  # {content-coding: bytes}
+        if compressible:
+            self.add_encoding('gzip', gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self.add_encoding('br', brotli.compress(body))
+
+    def add_encoding(self, coding, body):
+        if len(body) <= len(self.bodies['identity']) * (1 - MIN_SAVING):
+            self.bodies[coding] = body
+
+    def etag(self, coding):
+        # Each encoding is a different representation, so it gets its own strong ETag
+        return f'"{self.digest}"' if coding == 'identity' else f'"{self.digest}-{coding}"'
+
+
+def accepted_codings(header):
+    """Content codings from an Accept-Encoding header, leaving out those with q=0"""
+    codings = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.partition(';')
+        quality = params.strip().removeprefix('q=')
+        try:
+            if quality and float(quality) == 0:
+                continue
+        except ValueError:
+            pass
+        if coding.strip():
+            codings.add(coding.strip().lower())
+    return codings
+
+
+class AssetCache:
+    """Servable files under ``root`` keyed by URL path (``img/gaming.gif``).
+
+    ``lookup`` is independent of the web framework and returns
+    ``(status, headers, body)`` for both the aiohttp server and the
+    http.server handler of simple_server.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.assets = {}  # {url path: Asset}
+
+    def __len__(self):
+        return len(self.assets)
+
+    def load(self):
+        assets = {}
+        pages = []
+        for directory, subdirs, files in os.walk(self.root):
+            subdirs[:] = [d for d in subdirs if not d.startswith(('.', '__'))]
+            for filename in files:
+                extension = os.path.splitext(filename)[1].lower()
+                if filename.startswith('.') or extension not in CONTENT_TYPES:
+                    continue
+                path = os.path.join(directory, filename)
+                url_path = os.path.relpath(path, self.root).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    body = f.read()
+                if extension == '.html':
+                    pages.append((url_path, body))
+                else:
+                    assets[url_path] = Asset(CONTENT_TYPES[extension], body, extension in COMPRESSIBLE)
+
+        # Pages last, since their references carry the hashes of the other assets
+        for url_path, body in pages:
+            body = self.version_references(url_path, body.decode('utf-8'), assets).encode('utf-8')
+            assets[url_path] = Asset(CONTENT_TYPES['.html'], body, True)
+
+        self.assets = assets
+        raw = sum(len(a.bodies['identity']) for a in assets.values())
+        logger.info(f"Cached {len(assets)} static assets ({raw // 1024} KB) from {self.root}"
+                    f"{'' if brotli is not None else ', brotli not installed'}")
+        return self
+
+    def version_references(self, page, html, assets):
+        base = posixpath.dirname(page)
+
+        def versioned(match):
+            attribute, quote, target = match.groups()
+            asset = assets.get(posixpath.normpath(posixpath.join(base, target)).lstrip('/'))
+            if asset is None:
+                return match.group(0)
+            return f'{attribute}={quote}{target}?v={asset.digest}{quote}'
+        return REFERENCE.sub(versioned, html)
+
+    def lookup(self, path, version=None, accept_encoding=None, if_none_match=None):
+        """Response for a GET of ``path``: (status, headers, body), or None if nothing is served there"""
+        path = posixpath.normpath('/' + path).lstrip('/') or INDEX
+        asset = self.assets.get(path) or self.assets.get(posixpath.join(path, INDEX))
+        if asset is None:
+            return None
+
+        accepted = accepted_codings(accept_encoding)
+        coding = next((c for c in ('br', 'gzip') if c in asset.bodies and c in accepted), 'identity')
+        headers = {
+            'ETag': asset.etag(coding),
+            'Cache-Control': IMMUTABLE if version == asset.digest else REVALIDATE,
+            'Vary': 'Accept-Encoding'
+        }
+
+        if if_none_match:
+            tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+            if '*' in tags or not tags.isdisjoint(asset.etag(c) for c in asset.bodies):
+                return 304, headers, b''
+
+        body = asset.bodies[coding]
+        headers['Content-Type'] = asset.content_type
+        headers['Content-Length'] = str(len(body))
+        if coding != 'identity':
+            headers['Content-Encoding'] = coding
+        return 200, headers, body
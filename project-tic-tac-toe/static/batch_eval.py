@@ -0,0 +1,130 @@
+"""Vectorized win/threat counting over many boards at once (replays, puzzle mining, self-play)."""
+import functools
+
+import numpy as np
+
+from board import PLAYER_X, PLAYER_O
+
+EMPTY, X, O = 0, 1, 2
+SIDES = {PLAYER_X: X, PLAYER_O: O}
+
+# Patterns over a side's view of the board: 1 own stone, 0 empty cell
+FIVE = [(1, 1, 1, 1, 1)]
+OPEN_FOUR = [(0, 1, 1, 1, 1, 0)]
+OPEN_THREE = [(0, 1, 1, 1, 0)]
+BROKEN_THREE = [(0, 1, 1, 0, 1, 0), (0, 1, 0, 1, 1, 0)]
+
+
+def stack_boards(boards):
+    """Stack Board objects or lists of rows into an (N, size, size) int8 array of EMPTY/X/O"""
+    boards = list(boards)
+    if not boards:
+        return np.zeros((0, 15, 15), dtype=np.int8)
+    if isinstance(boards[0], list):
+        lookup = {PLAYER_X: X, PLAYER_O: O}
+        return np.array([[[lookup.get(cell, EMPTY) for cell in row] for row in rows] for rows in boards],
+                        dtype=np.int8)
+
+    size = boards[0].size
+    cells = size * size
+    nbytes = (cells + 7) // 8
+    out = np.zeros((len(boards), cells), dtype=np.int8)
+    for i, board in enumerate(boards):
+        for bits, value in ((board.x_bits, X), (board.o_bits, O)):
+            raw = np.frombuffer(bits.to_bytes(nbytes, 'little'), dtype=np.uint8)
+            out[i][np.unpackbits(raw, bitorder='little')[:cells].astype(bool)] = value
+    return out.reshape(len(boards), size, size)
+
+
+def pattern_code(pattern, side):
+    """Base-3 code of a pattern with its own stones written as side"""
+    code = 0
+    for cell in pattern:
+        code = code * 3 + (side if cell else EMPTY)
+    return code
+
+
+def window_codes(cells, length):
+    """Base-3 codes of all runs of `length` cells in the four check_winner directions.
+
+    Returns four int16 arrays shaped (N, rows, cols), one per direction. Each
+    is accumulated from shifted views of `cells` by Horner's rule, so no
+    window is copied and every pattern of that length is looked up in the
+    same codes.
+    """
+    size = cells.shape[1]
+    span = size - length + 1
+    if span <= 0:
+        return []
+    directions = [
+        lambda i: cells[:, :, i:span + i],  # horizontal
+        lambda i: cells[:, i:span + i, :],  # vertical
+        lambda i: cells[:, i:span + i, i:span + i],  # diagonal
+        lambda i: cells[:, i:span + i, length - 1 - i:length - 1 - i + span],  # anti-diagonal
+    ]
+    codes = []
+    for shifted in directions:
+        code = np.zeros(shifted(0).shape, dtype=np.int16)
+        for i in range(length):
+            code *= 3
+            code += shifted(i)
+        codes.append(code)
+    return codes
+
+
+@functools.lru_cache(maxsize=None)
+def pattern_table(length, groups):
+    """Lookup from window code to class number (0 = no pattern), and the (symbol, key) of each class"""
+    table = np.zeros(3 ** length, dtype=np.int16)
+    classes = []
+    for symbol, side in SIDES.items():
+        for key, patterns in groups:
+            patterns = [pattern for pattern in patterns if len(pattern) == length]
+            if not patterns:
+                continue
+            classes.append((symbol, key))
+            for pattern in patterns:
+                table[pattern_code(pattern, side)] = len(classes)
+    return table, classes
+
+
+def count_groups(cells, groups):
+    """Matches per board of each (key, patterns) group for both sides.
+
+    Every window is classified by one table lookup and all classes are
+    counted with a single bincount, so each window length costs one pass
+    whatever the number of patterns. Returns {symbol: {key: (N,) int32}}.
+    """
+    n = cells.shape[0]
+    groups = tuple((key, tuple(map(tuple, patterns))) for key, patterns in groups)
+    result = {symbol: {key: np.zeros(n, dtype=np.int32) for key, _ in groups} for symbol in SIDES}
+    for length in sorted({len(pattern) for _, patterns in groups for pattern in patterns}):
+        table, classes = pattern_table(length, groups)
+        width = len(classes) + 1
+        offsets = np.arange(n, dtype=np.int64)[:, None, None] * width
+        counts = np.zeros(n * width, dtype=np.int64)
+        for code in window_codes(cells, length):
+            counts += np.bincount((table[code] + offsets).ravel(), minlength=n * width)
+        counts = counts.reshape(n, width)
+        for number, (symbol, key) in enumerate(classes, 1):
+            result[symbol][key] += counts[:, number].astype(np.int32)
+    return result
+
+
+def evaluate_batch(cells):
+    """Count fives, open fours and open threes for both sides on every board.
+
+    `cells` is an (N, size, size) array from stack_boards. Returns
+    {'X': {'fives': (N,), 'open_fours': (N,), 'open_threes': (N,)}, 'O': {...}}.
+    """
+    return count_groups(cells, [('fives', FIVE), ('open_fours', OPEN_FOUR),
+                                ('open_threes', OPEN_THREE + BROKEN_THREE)])
+
+
+def winners(cells):
+    """(N,) array holding X or O for boards with five in a row, EMPTY otherwise"""
+    fives = count_groups(cells, [('fives', FIVE)])
+    out = np.full(cells.shape[0], EMPTY, dtype=np.int8)
+    for symbol, side in SIDES.items():
+        out[(fives[symbol]['fives'] > 0) & (out == EMPTY)] = side
+    return out
@@ -0,0 +1,221 @@
+"""Compact board representation shared by both game servers."""
+import random
+
+PLAYER_X = 'X'
+PLAYER_O = 'O'
+
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1)]  # horizontal, vertical, diagonal
+
+DEFAULT_SIZE = 15
+MIN_SIZE = 5  # room for five in a row
+MAX_SIZE = 30
+UNBOUNDED = 0  # board size of the sparse "infinite caro" variant
+COORD_LIMIT = 1 << 15  # sparse coordinates stay in the int16 range of binary move frames
+
+_zobrist_cache = {}  # {size: [key for (cell, side)]}
+
+
+def zobrist_keys(size):
+    """Random 64-bit keys, two per cell (X then O), fixed for a given board size"""
+    if size not in _zobrist_cache:
+        rng = random.Random(size)
+        _zobrist_cache[size] = [rng.getrandbits(64) for _ in range(size * size * 2)]
+    return _zobrist_cache[size]
+
+
+class Board:
+    """Caro board stored as one bitboard integer per side plus a move stack.
+
+    Cell (row, col) maps to bit ``row * size + col``, so occupancy checks are a
+    single shift-and-mask instead of indexing into a list of lists. ``hash`` is
+    the Zobrist hash of the position, updated with one XOR per move. An
+    optional ``threats`` index (see threats.py) is kept in step with the stones.
+    """
+
+    __slots__ = ('size', 'x_bits', 'o_bits', 'move_count', 'moves', 'cell_count', 'hash', 'zobrist',
+                 'threats')
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self.cell_count = size * size
+        self.zobrist = zobrist_keys(size)
+        self.threats = None
+        self.reset()
+
+    def reset(self):
+        """Clear all stones and the move stack"""
+        self.x_bits = 0
+        self.o_bits = 0
+        self.move_count = 0
+        self.moves = []  # [(row, col, symbol), ...] in play order
+        self.hash = 0
+        if self.threats is not None:
+            self.threats.clear()
+
+    def in_bounds(self, row, col):
+        return 0 <= row < self.size and 0 <= col < self.size
+
+    def _bit(self, row, col):
+        return 1 << (row * self.size + col)
+
+    def get(self, row, col):
+        """Return 'X', 'O' or None for the given cell"""
+        bit = self._bit(row, col)
+        if self.x_bits & bit:
+            return PLAYER_X
+        if self.o_bits & bit:
+            return PLAYER_O
+        return None
+
+    def is_empty(self, row, col):
+        return not (self.x_bits | self.o_bits) & self._bit(row, col)
+
+    def place(self, row, col, symbol):
+        """Put a stone on an empty cell and push it on the move stack"""
+        index = row * self.size + col
+        bit = 1 << index
+        if symbol == PLAYER_X:
+            self.x_bits |= bit
+            self.hash ^= self.zobrist[index * 2]
+        else:
+            self.o_bits |= bit
+            self.hash ^= self.zobrist[index * 2 + 1]
+        self.move_count += 1
+        self.moves.append((row, col, symbol))
+        if self.threats is not None:
+            self.threats.add(index, symbol)
+
+    def undo(self):
+        """Pop the last move off the stack and return it"""
+        row, col, symbol = self.moves.pop()
+        index = row * self.size + col
+        bit = 1 << index
+        if symbol == PLAYER_X:
+            self.x_bits &= ~bit
+            self.hash ^= self.zobrist[index * 2]
+        else:
+            self.o_bits &= ~bit
+            self.hash ^= self.zobrist[index * 2 + 1]
+        self.move_count -= 1
+        if self.threats is not None:
+            self.threats.remove(index, symbol)
+        return row, col, symbol
+
+    def is_full(self):
+        """Check if board is full using the stone counter, no cell scan"""
+        return self.move_count == self.cell_count
+
+    def check_winner(self, row, col, symbol):
+        """Check if the last move resulted in a win"""
+        bits = self.x_bits if symbol == PLAYER_X else self.o_bits
+        size = self.size
+
+        for dr, dc in DIRECTIONS:
+            count = 1
+
+            # Check in positive direction
+            r, c = row + dr, col + dc
+            while 0 <= r < size and 0 <= c < size and bits >> (r * size + c) & 1:
+                count += 1
+                r, c = r + dr, c + dc
+
+            # Check in negative direction
+            r, c = row - dr, col - dc
+            while 0 <= r < size and 0 <= c < size and bits >> (r * size + c) & 1:
+                count += 1
+                r, c = r - dr, c - dc
+
+            if count >= 5:
+                return True
+
+        return False
+
+    def to_rows(self):
+        """Return the board as a list of lists of 'X'/'O'/None"""
+        return [[self.get(r, c) for c in range(self.size)] for r in range(self.size)]
+
+
+def sparse_key(row, col, side):
+    """Zobrist key of a stone, mixed from its coordinates (splitmix64) instead of a table"""
+    z = ((row & 0xFFFF) << 17 | (col & 0xFFFF) << 1 | side) + 0x9E3779B97F4A7C15
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 & 0xFFFFFFFFFFFFFFFF
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EB & 0xFFFFFFFFFFFFFFFF
+    return z ^ (z >> 31)
+
+
+class SparseBoard:
+    """Unbounded board that stores only the placed stones, keyed by (row, col).
+
+    Same interface as Board, with ``size`` UNBOUNDED. Memory and win checks
+    grow with the number of moves rather than with a board area, and the
+    board is never full. Coordinates may be negative but stay within
+    +/-COORD_LIMIT so every move still fits a binary move frame.
+    """
+
+    __slots__ = ('size', 'stones', 'move_count', 'moves', 'hash')
+
+    def __init__(self):
+        self.size = UNBOUNDED
+        self.reset()
+
+    def reset(self):
+        """Clear all stones and the move stack"""
+        self.stones = {}  # {(row, col): symbol}
+        self.move_count = 0
+        self.moves = []  # [(row, col, symbol), ...] in play order
+        self.hash = 0
+
+    def in_bounds(self, row, col):
+        return -COORD_LIMIT <= row < COORD_LIMIT and -COORD_LIMIT <= col < COORD_LIMIT
+
+    def get(self, row, col):
+        """Return 'X', 'O' or None for the given cell"""
+        return self.stones.get((row, col))
+
+    def is_empty(self, row, col):
+        return (row, col) not in self.stones
+
+    def place(self, row, col, symbol):
+        """Put a stone on an empty cell and push it on the move stack"""
+        self.stones[(row, col)] = symbol
+        self.hash ^= sparse_key(row, col, symbol == PLAYER_O)
+        self.move_count += 1
+        self.moves.append((row, col, symbol))
+
+    def undo(self):
+        """Pop the last move off the stack and return it"""
+        row, col, symbol = self.moves.pop()
+        del self.stones[(row, col)]
+        self.hash ^= sparse_key(row, col, symbol == PLAYER_O)
+        self.move_count -= 1
+        return row, col, symbol
+
+    def is_full(self):
+        return False
+
+    def check_winner(self, row, col, symbol):
+        """Check if the last move resulted in a win"""
+        stones = self.stones
+        for dr, dc in DIRECTIONS:
+            count = 1
+            r, c = row + dr, col + dc
+            while stones.get((r, c)) == symbol:
+                count += 1
+                r, c = r + dr, c + dc
+            r, c = row - dr, col - dc
+            while stones.get((r, c)) == symbol:
+                count += 1
+                r, c = r - dr, c - dc
+            if count >= 5:
+                return True
+        return False
+
+
+def valid_size(size):
+    """Whether a room may be created with this board size"""
+    return type(size) is int and (size == UNBOUNDED or MIN_SIZE <= size <= MAX_SIZE)
+
+
+def make_board(size=DEFAULT_SIZE):
+    """A dense Board for a square size, or a SparseBoard for UNBOUNDED"""
+    return SparseBoard() if size == UNBOUNDED else Board(size)
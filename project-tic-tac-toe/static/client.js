@@ -2,16 +2,35 @@ const socket = io('http://localhost:3000');
 const boardElement = document.getElementById('board');
 const status = document.getElementById('status');
 const modeElement = document.getElementById('mode');
-const BOARD_SIZE = 15;
+const DEFAULT_BOARD_SIZE = 15;
+const UNBOUNDED = 0;  // board_size of the unbounded "infinite caro" variant
+const VIEW_MARGIN = 3;  // empty cells drawn around the stones of an unbounded board
 const PLAYER_X = 'X';
 const PLAYER_O = 'O';
 
+// Binary move frames (see protocol.py); set to false to use JSON moves
+const USE_BINARY_MOVES = true;
+const MOVE_REQUEST = 1;
+const MOVE_MADE = 2;
+const GAME_WON = 3;
+const FRAME_SYMBOLS = [PLAYER_X, PLAYER_O];
+
+// Quick-match rating; nothing records results yet, so every player sends this
+const DEFAULT_RATING = 1000;
+
 // Game state
-let board = Array(BOARD_SIZE).fill().map(() => Array(BOARD_SIZE).fill(null));
+let boardSize = DEFAULT_BOARD_SIZE;  // sent by the server for each room
+let stones = new Map();  // {"row,col": symbol}, only the placed stones
+let bounds = null;  // {top, left, bottom, right} around the stones, for unbounded boards
+let view = null;  // {top, left, rows, cols}: the cells drawn in the table
+let boardLocked = false;
 let mySymbol = null;
 let currentPlayer = PLAYER_X;
 let gameStarted = false;
 let roomId = null;
+let playerNames = {};  // {symbol: name}, for messages built from binary frames
+let lastSeq = 0;  // number of moves seen in the current game
+let gameNumber = null;
 
 // Get player info from localStorage
 const playerName = localStorage.getItem('playerName') || 'Người chơi';
@@ -27,6 +46,12 @@ if (gameMode === 'PVP') {
         status.textContent = `Đang tạo phòng ${roomId}...`;
     } else if (roomOption === 'join') {
         status.textContent = `Đang tham gia phòng ${roomId}...`;
+    } else if (roomOption === 'spectate') {
+        modeElement.textContent = `Xem - Phòng: ${roomId}`;
+        status.textContent = `Đang vào xem phòng ${roomId}...`;
+    } else if (roomOption === 'match') {
+        modeElement.textContent = 'PVP - Tìm trận nhanh';
+        status.textContent = 'Đang tìm đối thủ...';
     } else {
         status.textContent = 'Đang kết nối...';
     }
@@ -35,14 +60,64 @@ if (gameMode === 'PVP') {
     status.textContent = 'Đang khởi tạo...';
 }
 
+// Resume token for this room, kept for the tab's lifetime so reloads can rejoin too
+function resumeKey() {
+    return `resumeToken:${roomId}`;
+}
+
+function stoneKey(row, col) {
+    return `${row},${col}`;
+}
+
+function clearStones() {
+    stones = new Map();
+    bounds = null;
+}
+
+function setStone(row, col, symbol) {
+    stones.set(stoneKey(row, col), symbol);
+    if (!bounds) {
+        bounds = { top: row, left: col, bottom: row, right: col };
+    } else {
+        bounds.top = Math.min(bounds.top, row);
+        bounds.left = Math.min(bounds.left, col);
+        bounds.bottom = Math.max(bounds.bottom, row);
+        bounds.right = Math.max(bounds.right, col);
+    }
+}
+
+function setBoardSize(size) {
+    if (size === undefined || size === boardSize) return;
+    boardSize = size;
+    createBoard();
+}
+
+// The whole board, or for an unbounded board the stones plus a margin (at least 15x15 around the center)
+function boardView() {
+    if (boardSize !== UNBOUNDED) {
+        return { top: 0, left: 0, rows: boardSize, cols: boardSize };
+    }
+    const half = Math.floor(DEFAULT_BOARD_SIZE / 2);
+    let top = -half, left = -half, bottom = half, right = half;
+    if (bounds) {
+        top = Math.min(top, bounds.top - VIEW_MARGIN);
+        left = Math.min(left, bounds.left - VIEW_MARGIN);
+        bottom = Math.max(bottom, bounds.bottom + VIEW_MARGIN);
+        right = Math.max(right, bounds.right + VIEW_MARGIN);
+    }
+    return { top: top, left: left, rows: bottom - top + 1, cols: right - left + 1 };
+}
+
 function createBoard() {
+    view = boardView();
     boardElement.innerHTML = '';
-    for (let i = 0; i < BOARD_SIZE; i++) {
+    for (let i = 0; i < view.rows; i++) {
         const row = document.createElement('tr');
-        for (let j = 0; j < BOARD_SIZE; j++) {
+        for (let j = 0; j < view.cols; j++) {
             const cell = document.createElement('td');
-            cell.dataset.row = i;
-            cell.dataset.col = j;
+            cell.dataset.row = view.top + i;
+            cell.dataset.col = view.left + j;
+            cell.style.pointerEvents = boardLocked ? 'none' : 'auto';
             cell.addEventListener('click', handleCellClick);
             row.appendChild(cell);
         }
@@ -69,32 +144,60 @@ function handleCellClick(e) {
     const row = parseInt(e.target.dataset.row);
     const col = parseInt(e.target.dataset.col);
     
-    if (board[row][col]) {
+    if (stones.has(stoneKey(row, col))) {
         status.textContent = 'Ô đã được chọn!';
         return;
     }
     
     // Send move to server
-    socket.emit('make_move', {
-        room_id: roomId,
-        row: row,
-        col: col
-    });
+    if (USE_BINARY_MOVES) {
+        socket.emit('move_frame', encodeMoveRequest(row, col));
+    } else {
+        socket.emit('make_move', {
+            room_id: roomId,
+            row: row,
+            col: col
+        });
+    }
+}
+
+function encodeMoveRequest(row, col) {
+    const view = new DataView(new ArrayBuffer(5));
+    view.setUint8(0, MOVE_REQUEST);
+    view.setInt16(1, row);
+    view.setInt16(3, col);
+    return view.buffer;
+}
+
+function decodeMoveFrame(buffer) {
+    const view = new DataView(buffer);
+    return {
+        type: view.getUint8(0),
+        row: view.getInt16(1),
+        col: view.getInt16(3),
+        symbol: FRAME_SYMBOLS[view.getUint8(5)],
+        seq: view.getUint16(6),
+        current_player: FRAME_SYMBOLS[view.getUint8(8)]
+    };
 }
 
 function updateBoard() {
+    // An unbounded board grows its table when stones come near the edge
+    const next = boardView();
+    if (next.top !== view.top || next.left !== view.left || next.rows !== view.rows || next.cols !== view.cols) {
+        createBoard();
+    }
     const cells = boardElement.getElementsByTagName('td');
-    for (let i = 0; i < BOARD_SIZE; i++) {
-        for (let j = 0; j < BOARD_SIZE; j++) {
-            const cell = cells[i * BOARD_SIZE + j];
-            cell.textContent = board[i][j] || '';
-            cell.className = board[i][j] ? board[i][j].toLowerCase() : '';
-        }
+    for (let cell of cells) {
+        const symbol = stones.get(stoneKey(cell.dataset.row, cell.dataset.col));
+        cell.textContent = symbol || '';
+        cell.className = symbol ? symbol.toLowerCase() : '';
     }
 }
 
 function disableBoard() {
     gameStarted = false;
+    boardLocked = true;
     const cells = boardElement.getElementsByTagName('td');
     for (let cell of cells) {
         cell.style.pointerEvents = 'none';
@@ -103,6 +206,7 @@ function disableBoard() {
 
 function enableBoard() {
     gameStarted = true;
+    boardLocked = false;
     const cells = boardElement.getElementsByTagName('td');
     for (let cell of cells) {
         cell.style.pointerEvents = 'auto';
@@ -110,7 +214,7 @@ function enableBoard() {
 }
 
 function resetBoard() {
-    board = Array(BOARD_SIZE).fill().map(() => Array(BOARD_SIZE).fill(null));
+    clearStones();
     updateBoard();
     enableBoard();
 }
@@ -129,17 +233,40 @@ socket.on('connect', () => {
     console.log('Connected to server');
     
     if (gameMode === 'PVP' && roomId) {
-        if (roomOption === 'create') {
+        const token = sessionStorage.getItem(resumeKey());
+        if (roomOption === 'spectate') {
+            // Watch only: a snapshot now, then batched updates
+            socket.emit('spectate_room', { room_id: roomId });
+        } else if (token) {
+            // Reconnect: take our seat back and fetch only the missed moves
+            socket.emit('resume', {
+                room_id: roomId,
+                token: token,
+                last_seq: lastSeq,
+                game_number: gameNumber
+            });
+        } else if (roomOption === 'create') {
             // Create room
+            const size = parseInt(localStorage.getItem('boardSize'));
             socket.emit('create_room', {
                 room_id: roomId,
-                player_name: playerName
+                player_name: playerName,
+                binary: USE_BINARY_MOVES,
+                board_size: Number.isNaN(size) ? DEFAULT_BOARD_SIZE : size
             });
         } else if (roomOption === 'join') {
             // Join existing room
             socket.emit('join_room', {
                 room_id: roomId,
-                player_name: playerName
+                player_name: playerName,
+                binary: USE_BINARY_MOVES
+            });
+        } else if (roomOption === 'match') {
+            // Let the server pair us with a player of similar rating
+            socket.emit('find_match', {
+                player_name: playerName,
+                rating: DEFAULT_RATING,
+                binary: USE_BINARY_MOVES
             });
         }
     }
@@ -152,22 +279,47 @@ socket.on('connect_error', (err) => {
 
 socket.on('room_created', (data) => {
     mySymbol = data.symbol;
+    setBoardSize(data.board_size);
+    sessionStorage.setItem(resumeKey(), data.resume_token);
     status.textContent = data.message;
     console.log(`Room created: ${data.room_id}, symbol: ${data.symbol}`);
 });
 
 socket.on('room_joined', (data) => {
     mySymbol = data.symbol;
+    setBoardSize(data.board_size);
+    sessionStorage.setItem(resumeKey(), data.resume_token);
     status.textContent = data.message;
     console.log(`Room joined: ${data.room_id}, symbol: ${data.symbol}`);
 });
 
+socket.on('match_queued', (data) => {
+    status.textContent = data.message;
+    console.log(`Waiting for a match, ${data.waiting} in queue`);
+});
+
+socket.on('match_found', (data) => {
+    roomId = data.room_id;
+    mySymbol = data.symbol;
+    setBoardSize(data.board_size);
+    sessionStorage.setItem(resumeKey(), data.resume_token);
+    // A reload resumes this room instead of queueing again
+    localStorage.setItem('roomId', roomId);
+    modeElement.textContent = `PVP - Phòng: ${roomId}`;
+    status.textContent = data.message;
+    console.log(`Match found: ${data.room_id} vs ${data.opponent}, symbol: ${data.symbol}`);
+});
+
 socket.on('opponent_joined', (data) => {
     status.textContent = data.message;
     console.log(`Opponent joined: ${data.message}`);
 });
 
 socket.on('game_start', (data) => {
+    playerNames = data.players || playerNames;
+    gameNumber = data.game_number;
+    lastSeq = 0;
+    setBoardSize(data.board_size);
     status.textContent = data.message;
     currentPlayer = data.current_player;
     gameStarted = true;
@@ -175,9 +327,10 @@ socket.on('game_start', (data) => {
     console.log(`Game started: ${data.message}`);
 });
 
-socket.on('move_made', (data) => {
+function onMoveMade(data) {
     // Update board with the move
-    board[data.row][data.col] = data.symbol;
+    setStone(data.row, data.col, data.symbol);
+    lastSeq = data.seq;
     updateBoard();
     
     // Update current player
@@ -185,12 +338,13 @@ socket.on('move_made', (data) => {
     status.textContent = data.message;
     
     console.log(`Move made: (${data.row}, ${data.col}) = ${data.symbol}`);
-});
+}
 
-socket.on('game_over', (data) => {
+function onGameOver(data) {
     // Update board with final move
     if (data.row !== undefined && data.col !== undefined) {
-        board[data.row][data.col] = data.symbol;
+        setStone(data.row, data.col, data.symbol);
+        lastSeq = data.seq;
         updateBoard();
     }
     
@@ -198,9 +352,29 @@ socket.on('game_over', (data) => {
     disableBoard();
     
     console.log(`Game over: ${data.message}`);
+}
+
+socket.on('move_made', onMoveMade);
+socket.on('game_over', onGameOver);
+
+socket.on('move_frame', (buffer) => {
+    // Binary frames carry no text, so build the status message here
+    const frame = decodeMoveFrame(buffer);
+    if (frame.type === MOVE_MADE) {
+        frame.message = `${playerNames[frame.current_player]} (${frame.current_player}) lượt đi`;
+        onMoveMade(frame);
+    } else {
+        frame.message = frame.type === GAME_WON
+            ? `🎉 ${playerNames[frame.symbol]} (${frame.symbol}) thắng!`
+            : '🤝 Hòa!';
+        onGameOver(frame);
+    }
 });
 
 socket.on('game_restarted', (data) => {
+    playerNames = data.players || playerNames;
+    gameNumber = data.game_number;
+    lastSeq = 0;
     status.textContent = data.message;
     currentPlayer = data.current_player;
     resetBoard();
@@ -223,6 +397,86 @@ socket.on('player_left', (data) => {
     console.log(`Player left: ${data.message}`);
 });
 
+socket.on('opponent_disconnected', (data) => {
+    status.textContent = data.message;
+    console.log(`Opponent disconnected: ${data.message}`);
+});
+
+socket.on('opponent_resumed', (data) => {
+    status.textContent = data.message;
+    console.log(`Opponent resumed: ${data.message}`);
+});
+
+socket.on('resumed', (data) => {
+    // since is 0 when the server sends the whole game instead of a delta
+    setBoardSize(data.board_size);
+    if (data.since === 0) {
+        clearStones();
+    }
+    for (const [row, col, symbol] of data.moves) {
+        setStone(row, col, symbol);
+    }
+    updateBoard();
+    
+    mySymbol = data.symbol;
+    playerNames = data.players;
+    currentPlayer = data.current_player;
+    gameNumber = data.game_number;
+    lastSeq = data.seq;
+    if (data.game_started) {
+        enableBoard();
+    } else {
+        disableBoard();
+    }
+    status.textContent = data.message;
+    console.log(`Resumed room ${data.room_id}: ${data.moves.length} missed moves`);
+});
+
+socket.on('spectating', (data) => {
+    setBoardSize(data.board_size);
+    clearStones();
+    for (const [row, col, symbol] of data.moves) {
+        setStone(row, col, symbol);
+    }
+    updateBoard();
+    disableBoard();
+    
+    playerNames = data.players;
+    currentPlayer = data.current_player;
+    gameNumber = data.game_number;
+    lastSeq = data.seq;
+    status.textContent = data.message;
+    console.log(`Spectating room ${data.room_id}: ${data.seq} moves so far`);
+});
+
+socket.on('spectator_update', (data) => {
+    // Updates merge every change of the last moment; moves already shown are skipped by seq
+    setBoardSize(data.board_size);
+    if (data.reset || (data.game_number !== undefined && data.game_number !== gameNumber)) {
+        clearStones();
+        lastSeq = 0;
+    }
+    for (const [row, col, symbol, seq] of data.moves) {
+        if (seq > lastSeq) {
+            setStone(row, col, symbol);
+            lastSeq = seq;
+        }
+    }
+    updateBoard();
+    
+    if (data.players) playerNames = data.players;
+    if (data.game_number !== undefined) gameNumber = data.game_number;
+    if (data.current_player !== undefined) currentPlayer = data.current_player;
+    if (data.message) status.textContent = data.message;
+});
+
+socket.on('resume_failed', (data) => {
+    sessionStorage.removeItem(resumeKey());
+    status.textContent = data.message;
+    disableBoard();
+    console.log('Resume failed:', data.message);
+});
+
 socket.on('error', (data) => {
     status.textContent = data.message;
     console.log('Error:', data.message);
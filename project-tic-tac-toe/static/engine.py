@@ -0,0 +1,299 @@
+"""Server-side Caro AI: iterative-deepening alpha-beta with threat-space search."""
+import os
+import time
+from collections import OrderedDict
+
+from board import Board, PLAYER_X, PLAYER_O
+from threats import ThreatIndex, WIN_SCORE
+
+DEFAULT_TIME_LIMIT = 0.5  # seconds per move
+MAX_TIME_LIMIT = 2.0
+DEFAULT_MAX_DEPTH = 6
+BEAM_WIDTH = 12  # candidates kept per node after move ordering
+VCF_DEPTH = 8  # attacker moves tried by the continuous-four search
+TT_MAX_ENTRIES = int(os.environ.get('CARO_TT_ENTRIES', 200_000))  # ~200 bytes per entry
+
+# Transposition table entry flags
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+SIDE_TO_MOVE_KEY = 0x9E3779B97F4A7C15  # XORed into the hash when O is to move
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable:
+    """Bounded cache of searched positions keyed by Zobrist hash.
+
+    Entries are (depth, score, flag, best_move). When the table is full the
+    least recently used entry is evicted; a deeper result for the same key
+    always replaces a shallower one.
+    """
+
+    def __init__(self, max_entries=TT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key, depth, score, flag, best_move):
+        old = self.entries.get(key)
+        if old is not None and old[0] > depth:
+            self.entries.move_to_end(key)
+            return
+        self.entries[key] = (depth, score, flag, best_move)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Shared by every search in this process
+shared_table = TranspositionTable()
+
+
+def opponent(symbol):
+    return PLAYER_O if symbol == PLAYER_X else PLAYER_X
+
+
+def board_from_rows(rows):
+    """Build a Board from a list of lists of 'X'/'O'/None sent by a client"""
+    board = Board(len(rows))
+    for r, row in enumerate(rows):
+        for c, cell in enumerate(row):
+            if cell in (PLAYER_X, PLAYER_O):
+                board.place(r, c, cell)
+    return board
+
+
+class Search:
+    """One move search over a board; the board is restored when it returns.
+
+    The board gets a ThreatIndex attached if it has none, and every
+    evaluation and move-ordering decision reads that index.
+    """
+
+    def __init__(self, board, time_limit=DEFAULT_TIME_LIMIT, max_depth=DEFAULT_MAX_DEPTH, table=None):
+        self.board = board
+        self.table = shared_table if table is None else table
+        self.deadline = time.monotonic() + time_limit
+        self.max_depth = max_depth
+        if board.threats is None:
+            board.threats = ThreatIndex.from_board(board)
+        self.threats = board.threats
+        self.nodes = 0
+
+    def evaluate(self, symbol):
+        """Static score from the point of view of symbol"""
+        score = self.threats.score
+        return score[symbol] - score[opponent(symbol)]
+
+    def cells(self, indexes):
+        size = self.board.size
+        return [divmod(i, size) for i in indexes]
+
+    def candidates(self):
+        """Empty cells within CANDIDATE_RADIUS of any stone, as kept by the threat index"""
+        board = self.board
+        if not board.moves:
+            center = board.size // 2
+            return [(center, center)]
+        return self.cells(self.threats.candidates)
+
+    def ordered_moves(self, symbol, first=None):
+        """Candidates sorted by attack plus defence value, pruned to BEAM_WIDTH.
+
+        A pending five for either side makes the matching cells the only moves.
+        """
+        threats = self.threats
+        other = opponent(symbol)
+        forced = threats.winning_cells(symbol) or threats.winning_cells(other)
+        if forced:
+            return self.cells(sorted(forced))
+
+        size = self.board.size
+        scored = []
+        for r, c in self.candidates():
+            index = r * size + c
+            score = threats.cell_value(index, symbol) + threats.cell_value(index, other)
+            scored.append((score, (r, c)))
+        scored.sort(reverse=True)
+        moves = [move for _, move in scored[:BEAM_WIDTH]]
+        if first is not None and first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+    def position_key(self, symbol):
+        return self.board.hash ^ SIDE_TO_MOVE_KEY if symbol == PLAYER_O else self.board.hash
+
+    def negamax(self, depth, alpha, beta, symbol):
+        self.nodes += 1
+        if self.nodes & 255 == 0 and time.monotonic() > self.deadline:
+            raise SearchTimeout()
+
+        if depth == 0:
+            return self.evaluate(symbol)
+
+        alpha_orig = alpha
+        key = self.position_key(symbol)
+        entry = self.table.get(key)
+        tt_move = None
+        if entry is not None:
+            entry_depth, entry_score, flag, tt_move = entry
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return entry_score
+                if flag == LOWER_BOUND:
+                    alpha = max(alpha, entry_score)
+                else:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+
+        board = self.board
+        moves = self.ordered_moves(symbol, tt_move)
+        if not moves:
+            return 0
+
+        best = -WIN_SCORE * 2
+        best_move = None
+        for r, c in moves:
+            board.place(r, c, symbol)
+            try:
+                if board.check_winner(r, c, symbol):
+                    score = WIN_SCORE + depth  # prefer faster wins
+                elif board.is_full():
+                    score = 0
+                else:
+                    score = -self.negamax(depth - 1, -beta, -alpha, opponent(symbol))
+            finally:
+                board.undo()
+
+            if score > best:
+                best = score
+                best_move = (r, c)
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+
+        if best <= alpha_orig:
+            flag = UPPER_BOUND
+        elif best >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.table.store(key, depth, best, flag, best_move)
+        return best
+
+    def winning_cells(self, symbol):
+        """Empty cells that would complete five for symbol"""
+        return set(self.cells(self.threats.winning_cells(symbol)))
+
+    def vcf(self, symbol, depth=VCF_DEPTH):
+        """Threat-space search over continuous fours; returns the first attacking move or None"""
+        if depth == 0 or time.monotonic() > self.deadline:
+            return None
+        board = self.board
+        other = opponent(symbol)
+
+        for r, c in self.cells(sorted(self.threats.three_cells(symbol))):
+            self.nodes += 1
+            board.place(r, c, symbol)
+            try:
+                threats = self.winning_cells(symbol)
+                if len(threats) >= 2:
+                    return (r, c)  # open or double four, the opponent cannot block both
+                if len(threats) == 1:
+                    block = threats.pop()
+                    board.place(block[0], block[1], other)
+                    try:
+                        if (not board.check_winner(block[0], block[1], other)
+                                and not self.winning_cells(other)
+                                and self.vcf(symbol, depth - 1)):
+                            return (r, c)
+                    finally:
+                        board.undo()
+            finally:
+                board.undo()
+        return None
+
+    def best_move(self, symbol):
+        """Pick a move for symbol, deepening until the time budget runs out"""
+        # Forced moves: win now, then block the opponent's five
+        win = self.winning_cells(symbol)
+        if win:
+            return min(win), 1, WIN_SCORE
+        block = self.winning_cells(opponent(symbol))
+        if block:
+            return min(block), 1, -WIN_SCORE if len(block) > 1 else 0
+
+        attack = self.vcf(symbol)
+        if attack:
+            return attack, 0, WIN_SCORE
+
+        moves = self.ordered_moves(symbol)
+        if not moves:
+            return None, 0, 0
+        best, best_score, completed = moves[0], 0, 0
+
+        for depth in range(1, self.max_depth + 1):
+            try:
+                alpha = -WIN_SCORE * 2
+                iteration_best = moves[0]
+                for r, c in moves:
+                    self.board.place(r, c, symbol)
+                    try:
+                        if self.board.check_winner(r, c, symbol):
+                            score = WIN_SCORE + depth
+                        elif self.board.is_full():
+                            score = 0
+                        else:
+                            score = -self.negamax(depth - 1, -WIN_SCORE * 2, -alpha, opponent(symbol))
+                    finally:
+                        self.board.undo()
+                    if score > alpha:
+                        alpha = score
+                        iteration_best = (r, c)
+            except SearchTimeout:
+                break
+
+            best, best_score, completed = iteration_best, alpha, depth
+            # Search the previous best move first on the next iteration
+            moves.remove(best)
+            moves.insert(0, best)
+            if alpha >= WIN_SCORE:
+                break
+
+        return best, completed, best_score
+
+
+def find_best_move(board, symbol, time_limit=DEFAULT_TIME_LIMIT, max_depth=DEFAULT_MAX_DEPTH, table=None):
+    """Search for symbol's best move.
+
+    Returns a dict with row, col (None if the board is full), the deepest
+    completed depth, the score and the number of nodes searched. Searches
+    share ``shared_table`` unless another TranspositionTable is given.
+    """
+    search = Search(board, min(time_limit, MAX_TIME_LIMIT), max_depth, table)
+    move, depth, score = search.best_move(symbol)
+    row, col = move if move else (None, None)
+    return {'row': row, 'col': col, 'depth': depth, 'score': score, 'nodes': search.nodes}
@@ -0,0 +1,231 @@
+"""Append-only binary journal of every move, with a memory-mapped reader for replay and analytics.
+
+The file starts with an 8-byte header (magic, version, record size) followed
+by fixed-width little-endian records:
+
+    timestamp (f64, unix seconds), room_key (16 bytes), game_number (u32),
+    seq (u16), row (i16), col (i16), symbol (1 byte), pad
+
+Room ids are client-chosen and of any length, so a record holds
+room_key(room_id), a 16-byte BLAKE2b digest, rather than the id itself. A
+game is identified by (room_key, game_number) and its moves are the records
+with seq 1, 2, ...
+"""
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CJNL'
+VERSION = 2
+HEADER = struct.Struct('<4sHH')
+RECORD = struct.Struct('<d16sIHhh1sx')
+
+FLUSH_INTERVAL = 0.5  # seconds between writes while moves keep coming
+MAX_BATCH = 4096  # records buffered before an early write
+
+JournalRecord = namedtuple('JournalRecord', 'timestamp room_key game_number seq row col symbol')
+
+
+def room_key(room_id):
+    """Fixed-width key a room's records are stored under"""
+    return hashlib.blake2b(str(room_id).encode(), digest_size=16).digest()
+
+
+def encode_record(room_id, game_number, seq, row, col, symbol, timestamp=None):
+    if timestamp is None:
+        timestamp = time.time()
+    return RECORD.pack(timestamp, room_key(room_id), game_number, seq & 0xFFFF,
+                       row, col, symbol.encode())
+
+
+def decode_record(fields):
+    timestamp, key, game_number, seq, row, col, symbol = fields
+    return JournalRecord(timestamp, key, game_number, seq, row, col, symbol.decode())
+
+
+def write_all(fd, data):
+    """Append all of data; a failed write is cut back off so the file ends on a record boundary"""
+    start = os.fstat(fd).st_size
+    view = memoryview(data)
+    try:
+        while view:
+            view = view[os.write(fd, view):]
+    except OSError:
+        os.ftruncate(fd, start)
+        raise
+
+
+class JournalWriter:
+    """Buffers move records in memory and appends them to the file in batches.
+
+    ``record()`` only packs bytes into a buffer, so the move handlers never
+    wait on the disk; a background task writes the buffer every
+    FLUSH_INTERVAL seconds (sooner once MAX_BATCH records pile up) through
+    the loop's default thread pool.
+    """
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.buffer = []
+        self.fd = None
+        self.task = None
+        self.wakeup = None
+        self.closing = False
+
+    def start(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        size = os.fstat(self.fd).st_size
+        header = HEADER.pack(MAGIC, VERSION, RECORD.size)
+        if size < HEADER.size:
+            # Empty, or a crash cut the header short
+            os.ftruncate(self.fd, 0)
+            write_all(self.fd, header)
+        elif os.pread(self.fd, HEADER.size, 0) != header:
+            os.close(self.fd)
+            self.fd = None
+            raise ValueError(f'{self.path} is not a version {VERSION} game journal')
+        else:
+            # Drop a torn last record so new records stay aligned
+            os.ftruncate(self.fd, size - (size - HEADER.size) % RECORD.size)
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    def record(self, room_id, game_number, seq, row, col, symbol, timestamp=None):
+        self.buffer.append(encode_record(room_id, game_number, seq, row, col, symbol, timestamp))
+        if len(self.buffer) >= self.max_batch and self.wakeup is not None:
+            self.wakeup.set()
+
+    async def _run(self):
+        while not self.closing:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except OSError as e:
+                logger.error(f"Journal write failed: {e}")
+
+    async def flush(self):
+        if not self.buffer or self.fd is None:
+            return
+        data = b''.join(self.buffer)
+        self.buffer = []
+        await asyncio.get_running_loop().run_in_executor(None, write_all, self.fd, data)
+
+    async def close(self):
+        """Stop the background task and write whatever is still buffered"""
+        if self.task is not None:
+            # Let a write in progress finish rather than cancelling it half way
+            self.closing = True
+            self.wakeup.set()
+            await self.task
+            self.task = None
+        if self.fd is not None:
+            await self.flush()
+            os.close(self.fd)
+            self.fd = None
+
+
+class JournalReader:
+    """Read-only view of a journal file through mmap.
+
+    Records are decoded on access, so indexing, slicing and iteration cost
+    no more memory than the records actually touched; the OS pages the file
+    in as needed.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        if size:
+            magic, version, record_size = HEADER.unpack_from(self.map)
+            if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+                self.close()
+                raise ValueError(f'{path} is not a version {VERSION} game journal')
+        # A partly written last record (e.g. after a crash) is ignored
+        self.count = max(size - HEADER.size, 0) // RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('journal index out of range')
+        return decode_record(RECORD.unpack_from(self.map, HEADER.size + index * RECORD.size))
+
+    def __iter__(self):
+        end = HEADER.size + self.count * RECORD.size
+        for fields in RECORD.iter_unpack(memoryview(self.map)[HEADER.size:end]):
+            yield decode_record(fields)
+
+    def games(self):
+        """Yield (room_key, game_number, [records]) per game in one pass.
+
+        Moves of concurrent games are interleaved in the file, so only games
+        still being played at the current position are held in memory; a
+        game is yielded once its room starts the next game, and the rest at
+        the end of the file.
+        """
+        open_games = {}  # {room_key: (game_number, [records])}
+        for record in self:
+            current = open_games.get(record.room_key)
+            # A new game number, or seq starting over in a recreated room, ends the game
+            if current is not None and (current[0] != record.game_number
+                                        or record.seq <= current[1][-1].seq):
+                yield record.room_key, current[0], current[1]
+                current = None
+            if current is None:
+                current = open_games[record.room_key] = (record.game_number, [])
+            current[1].append(record)
+        for key, (game_number, records) in open_games.items():
+            yield key, game_number, records
+
+    def as_array(self):
+        """Zero-copy NumPy structured array over all records (needs numpy)"""
+        import numpy as np
+
+        dtype = np.dtype({
+            'names': ['timestamp', 'room_key', 'game_number', 'seq', 'row', 'col', 'symbol'],
+            'formats': ['<f8', 'V16', '<u4', '<u2', '<i2', '<i2', 'S1'],
+            'offsets': [0, 8, 24, 28, 30, 32, 34],
+            'itemsize': RECORD.size
+        })
+        return np.frombuffer(self.map, dtype=dtype, count=self.count, offset=HEADER.size)
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            try:
+                self.map.close()
+            except BufferError:
+                pass  # arrays from as_array() still use it; freed with them
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    # python journal.py games.journal  -> summary of the journal
+    with JournalReader(sys.argv[1]) as reader:
+        games = sum(1 for _ in reader.games())
+        print(f"{len(reader)} moves in {games} games")
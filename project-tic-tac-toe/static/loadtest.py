@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""Load test for server.py (socket.io) and simple_server.py (websockets).
+
+Plays full games between pairs of simulated clients over the real
+create_room/join_room/make_move protocol and reports moves per second,
+move-to-broadcast latency, server memory per room and event-loop lag.
+
+    python loadtest.py socketio --games 2000 --concurrency 500 --spawn
+    python loadtest.py both --games 500 --concurrency 200 --spawn --binary
+
+With --spawn the server is started as a subprocess so its memory can be
+sampled; otherwise pass --server-pid of a running server (Linux only).
+Server loop lag is estimated from a probe client's round trips to a cheap
+request (an invalid move on socket.io, a ping on websockets), compared with
+the same probe on the idle server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from board import DEFAULT_SIZE, UNBOUNDED
+from protocol import MOVE_MADE, ProtocolError, decode_move_frame, encode_move_request
+
+UNBOUNDED_WINDOW = 7  # random moves on an unbounded board stay this close to the origin
+SERVERS = {
+    'socketio': {'url': 'http://localhost:3000', 'script': 'server.py', 'port': 3000},
+    'websocket': {'url': 'ws://localhost:8001', 'script': 'simple_server.py', 'port': 8001},
+}
+SAMPLE_INTERVAL = 0.1  # seconds between memory, lag and probe samples
+EVENT_TIMEOUT = 30  # seconds to wait for any single server event
+
+
+class SimulatedClient:
+    """Incoming events are queued as (name, data) and consumed with expect()"""
+
+    def __init__(self, url, binary):
+        self.url = url
+        self.binary = binary
+        self.events = asyncio.Queue()
+
+    async def expect(self, *names):
+        """Wait for the next event with one of the names, skipping others"""
+        while True:
+            event, data = await asyncio.wait_for(self.events.get(), EVENT_TIMEOUT)
+            if event in names:
+                return event, data
+            if event == 'error':
+                raise RuntimeError(data.get('message'))
+
+
+class SocketIOClient(SimulatedClient):
+    """One simulated browser speaking client.js's socket.io events"""
+
+    def __init__(self, url, binary):
+        import socketio
+
+        super().__init__(url, binary)
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.sio.on('*', self._on_event)
+
+    async def _on_event(self, event, data=None):
+        if event == 'move_frame':
+            event, data = frame_event(data)
+        self.events.put_nowait((event, data))
+
+    async def connect(self):
+        await self.sio.connect(self.url, transports=['websocket'])
+
+    async def create_room(self, room_id, name, board_size=DEFAULT_SIZE):
+        await self.sio.emit('create_room', {'room_id': room_id, 'player_name': name, 'binary': self.binary,
+                                            'board_size': board_size})
+
+    async def join_room(self, room_id, name):
+        await self.sio.emit('join_room', {'room_id': room_id, 'player_name': name, 'binary': self.binary})
+
+    async def move(self, room_id, row, col):
+        if self.binary:
+            await self.sio.emit('move_frame', encode_move_request(row, col))
+        else:
+            await self.sio.emit('make_move', {'room_id': room_id, 'row': row, 'col': col})
+
+    async def probe(self):
+        # An invalid move is answered at once with an error event
+        await self.sio.emit('make_move', {'room_id': None, 'row': 0, 'col': 0})
+        await self.expect('error')
+
+    async def close(self):
+        await self.sio.disconnect()
+
+
+class WebSocketClient(SimulatedClient):
+    """One simulated browser speaking simple_client.js's JSON messages"""
+
+    def __init__(self, url, binary):
+        super().__init__(url, binary)
+        self.ws = None
+        self.reader = None
+
+    async def connect(self):
+        import websockets
+
+        self.ws = await websockets.connect(self.url, max_queue=None)
+        self.reader = asyncio.ensure_future(self._read())
+
+    async def _read(self):
+        try:
+            async for message in self.ws:
+                if isinstance(message, bytes):
+                    self.events.put_nowait(frame_event(message))
+                else:
+                    data = json.loads(message)
+                    self.events.put_nowait((data.get('type'), data))
+        except Exception:
+            pass
+
+    async def create_room(self, room_id, name, board_size=DEFAULT_SIZE):
+        await self.ws.send(json.dumps({'action': 'create_room', 'room_id': room_id, 'player_name': name,
+                                       'binary': self.binary, 'board_size': board_size}))
+
+    async def join_room(self, room_id, name):
+        await self.ws.send(json.dumps({'action': 'join_room', 'room_id': room_id,
+                                       'player_name': name, 'binary': self.binary}))
+
+    async def move(self, room_id, row, col):
+        if self.binary:
+            await self.ws.send(encode_move_request(row, col))
+        else:
+            await self.ws.send(json.dumps({'action': 'make_move', 'room_id': room_id, 'row': row, 'col': col}))
+
+    async def probe(self):
+        # Pongs are answered by the server's event loop
+        pong = await self.ws.ping()
+        await asyncio.wait_for(pong, EVENT_TIMEOUT)
+
+    async def close(self):
+        await self.ws.close()
+        if self.reader is not None:
+            await self.reader
+
+
+CLIENTS = {'socketio': SocketIOClient, 'websocket': WebSocketClient}
+
+
+def frame_event(frame):
+    """Map a binary move frame to the JSON event it stands for"""
+    try:
+        data = decode_move_frame(frame)
+    except ProtocolError:
+        return 'error', {'message': 'Invalid move frame'}
+    return ('move_made' if data['type'] == MOVE_MADE else 'game_over'), data
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def rss_bytes(pid):
+    """Resident memory of a process from /proc, or None where unavailable"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class Stats:
+    def __init__(self):
+        self.moves = 0
+        self.games = 0
+        self.failed = 0
+        self.latencies = []  # seconds from sending a move to the opponent receiving it
+        self.active_rooms = 0
+        self.peak_rooms = 0
+        self.peak_rss = None
+        self.probe_rtts = []
+        self.client_lag = []
+
+
+def board_cells(board_size):
+    if board_size == UNBOUNDED:
+        span = range(-UNBOUNDED_WINDOW, UNBOUNDED_WINDOW + 1)
+    else:
+        span = range(board_size)
+    return [(r, c) for r in span for c in span]
+
+
+async def play_game(client_cls, url, binary, room_id, rng, stats, board_size=DEFAULT_SIZE):
+    """Create a room with two clients and play random moves until a win or draw"""
+    x, o = client_cls(url, binary), client_cls(url, binary)
+    try:
+        await asyncio.gather(x.connect(), o.connect())
+        await x.create_room(room_id, f'{room_id}-x', board_size)
+        await x.expect('room_created')
+        await o.join_room(room_id, f'{room_id}-o')
+        await o.expect('room_joined')
+        stats.active_rooms += 1
+        stats.peak_rooms = max(stats.peak_rooms, stats.active_rooms)
+        try:
+            await asyncio.gather(x.expect('game_start'), o.expect('game_start'))
+
+            cells = board_cells(board_size)
+            rng.shuffle(cells)
+            mover, other = x, o
+            for row, col in cells:
+                sent = time.perf_counter()
+                await mover.move(room_id, row, col)
+                event, _ = await other.expect('move_made', 'game_over')
+                stats.latencies.append(time.perf_counter() - sent)
+                await mover.expect('move_made', 'game_over')
+                stats.moves += 1
+                if event == 'game_over':
+                    break
+                mover, other = other, mover
+            stats.games += 1
+        finally:
+            stats.active_rooms -= 1
+    except Exception as e:
+        stats.failed += 1
+        if stats.failed <= 5:
+            print(f"Game {room_id} failed: {e!r}", file=sys.stderr)
+    finally:
+        for client in (x, o):
+            try:
+                await client.close()
+            except Exception:
+                pass
+
+
+async def sample(stats, probe, pid, stop):
+    """Record client loop lag, server probe round trips and server memory until stop is set"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(SAMPLE_INTERVAL)
+        stats.client_lag.append(max(loop.time() - started - SAMPLE_INTERVAL, 0.0))
+        if probe is not None:
+            sent = time.perf_counter()
+            try:
+                await probe.probe()
+                stats.probe_rtts.append(time.perf_counter() - sent)
+            except Exception:
+                pass
+        if pid is not None:
+            rss = rss_bytes(pid)
+            if rss is not None:
+                stats.peak_rss = max(stats.peak_rss or 0, rss)
+
+
+async def idle_probe(probe, count=20):
+    rtts = []
+    for _ in range(count):
+        sent = time.perf_counter()
+        await probe.probe()
+        rtts.append(time.perf_counter() - sent)
+        await asyncio.sleep(0.01)
+    return rtts
+
+
+async def run(kind, url, games, concurrency, binary, pid, seed, board_size=DEFAULT_SIZE):
+    client_cls = CLIENTS[kind]
+    stats = Stats()
+    rng = random.Random(seed)
+    run_id = f'{os.getpid():x}{int(time.time()) % 100000:x}'
+
+    probe = client_cls(url, binary)
+    await probe.connect()
+    idle_rtts = await idle_probe(probe)
+    base_rss = rss_bytes(pid) if pid is not None else None
+
+    stop = asyncio.Event()
+    sampler = asyncio.ensure_future(sample(stats, probe, pid, stop))
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(n):
+        async with limit:
+            await play_game(client_cls, url, binary, f'lt{run_id}-{n}', random.Random(rng.random()), stats,
+                            board_size)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(games)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+    await probe.close()
+
+    memory_per_room = None
+    if base_rss is not None and stats.peak_rss is not None and stats.peak_rooms:
+        memory_per_room = (stats.peak_rss - base_rss) / stats.peak_rooms
+    idle = percentile(idle_rtts, 50)
+    return {
+        'server': kind,
+        'binary': binary,
+        'board_size': board_size,
+        'games': stats.games,
+        'failed': stats.failed,
+        'moves': stats.moves,
+        'seconds': elapsed,
+        'moves_per_second': stats.moves / elapsed if elapsed else 0.0,
+        'latency_p50_ms': percentile(stats.latencies, 50) * 1000,
+        'latency_p99_ms': percentile(stats.latencies, 99) * 1000,
+        'latency_max_ms': max(stats.latencies, default=0.0) * 1000,
+        'peak_rooms': stats.peak_rooms,
+        'memory_per_room_kb': memory_per_room / 1024 if memory_per_room is not None else None,
+        'peak_rss_mb': stats.peak_rss / 2 ** 20 if stats.peak_rss is not None else None,
+        'server_loop_lag_p50_ms': max(percentile(stats.probe_rtts, 50) - idle, 0.0) * 1000,
+        'server_loop_lag_p99_ms': max(percentile(stats.probe_rtts, 99) - idle, 0.0) * 1000,
+        'client_loop_lag_p99_ms': percentile(stats.client_lag, 99) * 1000,
+    }
+
+
+def wait_for_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('localhost', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def spawn_server(kind):
+    """Start a server next to this file with its output discarded; returns the process"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen([sys.executable, SERVERS[kind]['script']], cwd=here,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not wait_for_port(SERVERS[kind]['port']):
+        process.terminate()
+        raise SystemExit(f"{SERVERS[kind]['script']} did not start listening")
+    return process
+
+
+def format_value(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f'{value:.2f}'
+    return str(value)
+
+
+def print_table(results):
+    keys = [key for key in results[0] if key != 'server']
+    width = max(len(key) for key in keys)
+    print(f"{'':{width}}  " + '  '.join(f"{r['server']:>12}" for r in results))
+    for key in keys:
+        print(f"{key:{width}}  " + '  '.join(f"{format_value(r[key]):>12}" for r in results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the caro game servers')
+    parser.add_argument('server', choices=['socketio', 'websocket', 'both'])
+    parser.add_argument('--games', type=int, default=200, help='games to play in total')
+    parser.add_argument('--concurrency', type=int, default=100,
+                        help='games played at once (two clients each)')
+    parser.add_argument('--binary', action='store_true', help='use binary move frames')
+    parser.add_argument('--url', help='server URL (single server only)')
+    parser.add_argument('--spawn', action='store_true', help='start each server as a subprocess')
+    parser.add_argument('--server-pid', type=int, help='pid of a running server, for memory sampling')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--board-size', type=int, default=DEFAULT_SIZE,
+                        help=f'board size of each room, {UNBOUNDED} for an unbounded board')
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    args = parser.parse_args()
+
+    kinds = ['socketio', 'websocket'] if args.server == 'both' else [args.server]
+    results = []
+    for kind in kinds:
+        process = spawn_server(kind) if args.spawn else None
+        pid = process.pid if process is not None else args.server_pid
+        url = args.url if args.url and len(kinds) == 1 else SERVERS[kind]['url']
+        try:
+            results.append(asyncio.run(run(kind, url, args.games, args.concurrency, args.binary,
+                                           pid, args.seed, args.board_size)))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+    else:
+        print_table(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""In-memory matchmaking: players wait in rating buckets and are paired in batches on a timer tick."""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATING = 1000
+MAX_RATING = 4000
+BUCKET_WIDTH = 100  # rating points per bucket
+WIDEN_AFTER = 5.0  # seconds of waiting that widen a player's search by one bucket
+TICK_INTERVAL = 0.25  # seconds between pairing passes
+
+
+class Ticket:
+    """A player waiting for a match"""
+
+    __slots__ = ('sid', 'name', 'rating', 'binary', 'queued_at')
+
+    def __init__(self, sid, name, rating=DEFAULT_RATING, binary=False, queued_at=None):
+        self.sid = sid
+        self.name = name
+        self.rating = rating
+        self.binary = binary
+        self.queued_at = time.monotonic() if queued_at is None else queued_at
+
+
+class MatchQueue:
+    """Waiting players indexed by rating bucket, oldest first within each bucket.
+
+    Joining and leaving are O(1). ``pair`` first matches players inside the
+    same bucket in arrival order, then lets the one player left over in a
+    bucket meet the leftover of a neighbouring bucket once either has waited
+    long enough to widen that far, so a pass costs O(players + buckets).
+    """
+
+    def __init__(self, bucket_width=BUCKET_WIDTH, widen_after=WIDEN_AFTER):
+        self.bucket_width = bucket_width
+        self.widen_after = widen_after
+        self.buckets = {}  # {bucket: OrderedDict{sid: Ticket}}
+        self.tickets = {}  # {sid: Ticket}
+
+    def __len__(self):
+        return len(self.tickets)
+
+    def __contains__(self, sid):
+        return sid in self.tickets
+
+    def bucket(self, rating):
+        return int(rating) // self.bucket_width
+
+    def add(self, ticket):
+        key = self.bucket(ticket.rating)  # raises before any state changes
+        self.remove(ticket.sid)
+        self.tickets[ticket.sid] = ticket
+        self.buckets.setdefault(key, OrderedDict())[ticket.sid] = ticket
+
+    def remove(self, sid):
+        """Take a player out of the queue; returns their ticket or None"""
+        ticket = self.tickets.pop(sid, None)
+        if ticket is not None:
+            key = self.bucket(ticket.rating)
+            waiting = self.buckets[key]
+            del waiting[ticket.sid]
+            if not waiting:
+                del self.buckets[key]
+        return ticket
+
+    def reach(self, ticket, now):
+        """How many buckets away this player accepts an opponent"""
+        return int((now - ticket.queued_at) // self.widen_after)
+
+    def pair(self, now=None):
+        """Remove and return every (ticket, ticket) pair that can be matched now"""
+        now = time.monotonic() if now is None else now
+        pairs = []
+        leftovers = []  # (bucket, ticket), at most one per bucket
+        for key in sorted(self.buckets):
+            waiting = self.buckets[key]
+            while len(waiting) >= 2:
+                _, first = waiting.popitem(last=False)
+                _, second = waiting.popitem(last=False)
+                pairs.append((first, second))
+            if waiting:
+                leftovers.append((key, next(iter(waiting.values()))))
+
+        i = 0
+        while i + 1 < len(leftovers):
+            (key, ticket), (next_key, other) = leftovers[i], leftovers[i + 1]
+            if next_key - key <= max(self.reach(ticket, now), self.reach(other, now)):
+                for left in (ticket, other):
+                    del self.buckets[self.bucket(left.rating)][left.sid]
+                pairs.append((ticket, other) if ticket.queued_at <= other.queued_at else (other, ticket))
+                i += 2
+            else:
+                i += 1
+
+        for first, second in pairs:
+            del self.tickets[first.sid]
+            del self.tickets[second.sid]
+        for key in [key for key, waiting in self.buckets.items() if not waiting]:
+            del self.buckets[key]
+        return pairs
+
+
+class Matchmaker:
+    """Runs MatchQueue.pair every TICK_INTERVAL and hands each pair to ``on_match``.
+
+    ``on_match(first, second)`` is a coroutine function; the first ticket is
+    the one that waited longer.
+    """
+
+    def __init__(self, tick_interval=TICK_INTERVAL, queue=None):
+        self.tick_interval = tick_interval
+        self.queue = queue if queue is not None else MatchQueue()
+        self.on_match = None
+        self.task = None
+
+    def start(self, on_match):
+        self.on_match = on_match
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            if len(self.queue) < 2:
+                continue
+            pairs = self.queue.pair()
+            if pairs:
+                results = await asyncio.gather(*(self.on_match(first, second) for first, second in pairs),
+                                               return_exceptions=True)
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.error(f"Failed to start matched game: {result}")
@@ -0,0 +1,157 @@
+"""Low-overhead server metrics in the Prometheus text format, plus queue-based logging.
+
+Recording is a bisect and two additions per sample on the event loop; all
+formatting happens when /metrics is scraped.
+"""
+import asyncio
+import functools
+import logging
+import logging.handlers
+import queue
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds, from sub-millisecond handlers to multi-second stalls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LOOP_LAG_INTERVAL = 0.25  # seconds between event-loop lag samples
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels=''):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {self.count}')
+        suffix = f'{{{labels.rstrip(",")}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {self.sum}')
+        lines.append(f'{name}_count{suffix} {self.count}')
+        return lines
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Metrics:
+    """Per-handler latency histograms, gauges and an event-loop lag monitor.
+
+    Wrap socket handlers with ``timed`` (below ``@sio.event``, which needs the
+    original name). Gauges whose value lives elsewhere are passed to
+    ``render`` at scrape time.
+    """
+
+    def __init__(self, prefix='caro_'):
+        self.prefix = prefix
+        self.handlers = {}  # {handler name: Histogram}
+        self.gauges = {}  # {name: Gauge}
+        self.loop_lag = Histogram()
+        self.lag_task = None
+
+    def histogram(self, name):
+        histogram = self.handlers.get(name)
+        if histogram is None:
+            histogram = self.handlers[name] = Histogram()
+        return histogram
+
+    def gauge(self, name):
+        gauge = self.gauges.get(name)
+        if gauge is None:
+            gauge = self.gauges[name] = Gauge()
+        return gauge
+
+    def timed(self, handler):
+        """Record how long each call of an async handler takes, errors included.
+
+        Handlers must accept every argument python-socketio passes (``auth``,
+        ``reason``): it retries a call that raises TypeError with fewer
+        arguments, and the failed call would be recorded as a sample too.
+        """
+        histogram = self.histogram(handler.__name__)
+
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+
+    def start(self):
+        self.lag_task = asyncio.get_running_loop().create_task(self._sample_loop_lag())
+
+    async def stop(self):
+        if self.lag_task is not None:
+            self.lag_task.cancel()
+            try:
+                await self.lag_task
+            except asyncio.CancelledError:
+                pass
+            self.lag_task = None
+
+    async def _sample_loop_lag(self):
+        # How late a timer fires is how long the loop was busy with something else
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag.observe(max(loop.time() - started - LOOP_LAG_INTERVAL, 0.0))
+
+    def render(self, extra_gauges=None):
+        """Prometheus text exposition of everything recorded so far"""
+        name = f'{self.prefix}handler_latency_seconds'
+        lines = [f'# TYPE {name} histogram']
+        for handler, histogram in sorted(self.handlers.items()):
+            lines.extend(histogram.render(name, f'handler="{handler}",'))
+
+        name = f'{self.prefix}event_loop_lag_seconds'
+        lines.append(f'# TYPE {name} histogram')
+        lines.extend(self.loop_lag.render(name))
+
+        gauges = {key: gauge.value for key, gauge in self.gauges.items()}
+        gauges.update(extra_gauges or {})
+        for key, value in sorted(gauges.items()):
+            lines.append(f'# TYPE {self.prefix}{key} gauge')
+            lines.append(f'{self.prefix}{key} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def start_queue_logging():
+    """Move the root logger's handlers behind a queue drained by a background thread.
+
+    Log calls on the event loop then only enqueue the record; formatting and
+    writing to the stream happen on the listener thread. Returns the
+    QueueListener, which must be stopped to flush the last records.
+    """
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener.start()
+    return listener
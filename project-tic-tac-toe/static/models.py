@@ -0,0 +1,117 @@
+"""Room and player state shared by both game servers."""
+from board import DEFAULT_SIZE, PLAYER_X, PLAYER_O, make_board
+
+
+class Player:
+    """A seat in a room. ``conn`` is the socket.io sid or the websocket connection.
+
+    ``binary`` is set when the client asked for binary move frames (protocol.py).
+    ``token`` lets the client take the seat back after a dropped connection;
+    while it is away ``conn`` is None.
+    """
+
+    __slots__ = ('conn', 'name', 'symbol', 'binary', 'token')
+
+    def __init__(self, conn, name, symbol, binary=False, token=None):
+        self.conn = conn
+        self.name = name
+        self.symbol = symbol
+        self.binary = binary
+        self.token = token
+
+    @property
+    def connected(self):
+        return self.conn is not None
+
+    def swap_symbol(self):
+        self.symbol = PLAYER_O if self.symbol == PLAYER_X else PLAYER_X
+
+    def to_dict(self):
+        return {'conn': self.conn, 'name': self.name, 'symbol': self.symbol,
+                'binary': self.binary, 'token': self.token}
+
+
+class Room:
+    """One game room: up to two players, the board and whose turn it is.
+
+    ``current_turn`` is the index into ``players`` of the player to move.
+    ``board.moves`` doubles as the move log of the current game: move ``seq``
+    is ``board.moves[seq - 1]``. ``game_number`` goes up on every restart so
+    clients can tell a log from an earlier game apart. ``board_size`` is fixed
+    when the room is created; UNBOUNDED rooms get a sparse board.
+    """
+
+    __slots__ = ('room_id', 'players', 'board', 'current_turn', 'game_started', 'game_number')
+
+    def __init__(self, room_id, board_size=DEFAULT_SIZE):
+        self.room_id = room_id
+        self.players = []
+        self.board = make_board(board_size)
+        self.current_turn = 0
+        self.game_started = False
+        self.game_number = 0
+
+    @property
+    def board_size(self):
+        return self.board.size
+
+    def is_full(self):
+        return len(self.players) >= 2
+
+    def current_player(self):
+        return self.players[self.current_turn]
+
+    def next_turn(self):
+        """Pass the turn to the other player and return them"""
+        self.current_turn = 1 - self.current_turn
+        return self.players[self.current_turn]
+
+    def reset(self):
+        """Clear the board for a new game; the first player moves first"""
+        self.board.reset()
+        self.current_turn = 0
+        self.game_number += 1
+
+    def player_index(self, conn, hint=None):
+        """Seat of the player on conn, checking the hinted seat first"""
+        if hint is not None and hint < len(self.players) and self.players[hint].conn == conn:
+            return hint
+        for i, player in enumerate(self.players):
+            if player.conn == conn:
+                return i
+        return None
+
+    def token_index(self, token):
+        """Seat holding the resume token, or None"""
+        for i, player in enumerate(self.players):
+            if token and player.token == token:
+                return i
+        return None
+
+    def moves_since(self, seq):
+        """Moves of the current game after move number seq"""
+        return self.board.moves[seq:]
+
+    def to_dict(self):
+        """JSON-safe form for shared stores; the board is kept as its move list"""
+        return {
+            'room_id': self.room_id,
+            'board_size': self.board.size,
+            'players': [player.to_dict() for player in self.players],
+            'moves': self.board.moves,
+            'current_turn': self.current_turn,
+            'game_started': self.game_started,
+            'game_number': self.game_number
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        room = cls(data['room_id'], data.get('board_size', DEFAULT_SIZE))
+        room.players = [Player(p['conn'], p['name'], p['symbol'], p.get('binary', False), p.get('token'))
+                        for p in data['players']]
+        for row, col, symbol in data['moves']:
+            room.board.place(row, col, symbol)
+        room.current_turn = data['current_turn']
+        room.game_started = data['game_started']
+        room.game_number = data.get('game_number', 0)
+        return room
@@ -0,0 +1,61 @@
+"""Compact binary frames for moves, negotiated per connection with JSON as the fallback.
+
+Client -> server, make_move (5 bytes):
+    type (u8) = MOVE_REQUEST, row (i16), col (i16)
+
+Server -> client, move_made / game_over (9 bytes):
+    type (u8) = MOVE_MADE | GAME_WON | GAME_DRAWN, row (i16), col (i16),
+    symbol (u8, 0 = X, 1 = O), seq (u16, move number in the game),
+    turn (u8, symbol to move next)
+
+All fields are big-endian. Clients build the human-readable status
+messages themselves from the player names sent with game_start.
+"""
+import struct
+
+from board import PLAYER_X, PLAYER_O
+
+MOVE_REQUEST = 1
+MOVE_MADE = 2
+GAME_WON = 3
+GAME_DRAWN = 4
+
+MOVE_REQUEST_FRAME = struct.Struct('>Bhh')
+MOVE_FRAME = struct.Struct('>BhhBHB')
+
+SYMBOL_CODES = {PLAYER_X: 0, PLAYER_O: 1}
+SYMBOLS = (PLAYER_X, PLAYER_O)
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def encode_move_request(row, col):
+    return MOVE_REQUEST_FRAME.pack(MOVE_REQUEST, row, col)
+
+
+def decode_move_request(data):
+    """Return (row, col) from a binary make_move frame"""
+    if len(data) != MOVE_REQUEST_FRAME.size or data[0] != MOVE_REQUEST:
+        raise ProtocolError('Invalid move frame')
+    _, row, col = MOVE_REQUEST_FRAME.unpack(data)
+    return row, col
+
+
+def encode_move_frame(kind, row, col, symbol, seq, next_symbol=PLAYER_X):
+    return MOVE_FRAME.pack(kind, row, col, SYMBOL_CODES[symbol], seq & 0xFFFF, SYMBOL_CODES[next_symbol])
+
+
+def decode_move_frame(data):
+    if len(data) != MOVE_FRAME.size:
+        raise ProtocolError('Invalid move frame')
+    kind, row, col, symbol, seq, turn = MOVE_FRAME.unpack(data)
+    return {
+        'type': kind,
+        'row': row,
+        'col': col,
+        'symbol': SYMBOLS[symbol],
+        'seq': seq,
+        'current_player': SYMBOLS[turn]
+    }
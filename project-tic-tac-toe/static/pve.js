@@ -3,13 +3,16 @@ const status = document.getElementById('status');
 const modeElement = document.getElementById('mode');
 const canvas = document.getElementById('win-line-canvas');
 const ctx = canvas.getContext('2d');
-const BOARD_SIZE = 15;
+// Kích thước chọn ở màn hình bắt đầu; bàn vô hạn (0) chỉ có ở PVP nên quay về 15
+const BOARD_SIZE = parseInt(localStorage.getItem('boardSize')) || 15;
 const PLAYER_X = 'X';
 const PLAYER_O = 'O';
 let currentPlayer = PLAYER_X;
 let botIsX = false; // Người chơi là X ban đầu
 const playerName = localStorage.getItem('playerName') || 'Người chơi';
 let board = Array(BOARD_SIZE).fill().map(() => Array(BOARD_SIZE).fill(null));
+// Bot chạy trên server nếu kết nối được, nếu không dùng bot cục bộ
+const aiSocket = typeof io !== 'undefined' ? io('http://localhost:3000') : null;
 
 modeElement.textContent = 'PVE';
 
@@ -203,6 +206,34 @@ function hasBotSequence(count) {
 }
 
 function aiMove() {
+    const botSymbol = botIsX ? PLAYER_X : PLAYER_O;
+    if (aiSocket && aiSocket.connected) {
+        console.log('Bot (server) đang chọn nước đi...');
+        aiSocket.emit('request_ai_move', { board: board, symbol: botSymbol });
+        return;
+    }
+    localAiMove();
+}
+
+if (aiSocket) {
+    aiSocket.on('ai_move', (data) => {
+        const botSymbol = botIsX ? PLAYER_X : PLAYER_O;
+        if (currentPlayer !== botSymbol || data.symbol !== botSymbol || board[data.row][data.col]) {
+            return;
+        }
+        console.log('Bot (server) chọn nước đi:', data.row, data.col);
+        makeMove(data.row, data.col, botSymbol);
+    });
+
+    aiSocket.on('error', (data) => {
+        console.log('Lỗi bot server, dùng bot cục bộ:', data.message);
+        if (currentPlayer === (botIsX ? PLAYER_X : PLAYER_O)) {
+            localAiMove();
+        }
+    });
+}
+
+function localAiMove() {
     console.log('Bot đang chọn nước đi...');
     const botSymbol = botIsX ? PLAYER_X : PLAYER_O;
     const playerSymbol = botIsX ? PLAYER_O : PLAYER_X;
@@ -0,0 +1,59 @@
+"""Per-room delayed game events (start countdown, turn clocks, abandonment) on loop timers."""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RoomScheduler:
+    """Named, cancellable timers grouped by room.
+
+    Handlers schedule a coroutine function and return right away; the event
+    loop runs it when the timer fires. Scheduling a name that is already
+    pending replaces the old timer, and cancel(room_id) drops every timer of a
+    room, e.g. when a player leaves.
+    """
+
+    def __init__(self):
+        self.timers = {}  # {room_id: {name: asyncio.TimerHandle}}
+        self.tasks = set()  # running callbacks, referenced until done
+
+    def schedule(self, room_id, name, delay, callback, *args):
+        """Run ``await callback(*args)`` after delay seconds"""
+        self.cancel(room_id, name)
+        loop = asyncio.get_running_loop()
+        handle = loop.call_later(delay, self._fire, room_id, name, callback, args)
+        self.timers.setdefault(room_id, {})[name] = handle
+
+    def _fire(self, room_id, name, callback, args):
+        self._forget(room_id, name)
+        task = asyncio.ensure_future(callback(*args))
+        self.tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Scheduled room event failed: {task.exception()}")
+
+    def _forget(self, room_id, name):
+        timers = self.timers.get(room_id)
+        if timers is not None:
+            timers.pop(name, None)
+            if not timers:
+                del self.timers[room_id]
+
+    def is_pending(self, room_id, name):
+        return name in self.timers.get(room_id, {})
+
+    def cancel(self, room_id, name=None):
+        """Cancel one named timer of a room, or all of them"""
+        timers = self.timers.get(room_id)
+        if timers is None:
+            return
+        names = [name] if name is not None else list(timers)
+        for key in names:
+            handle = timers.get(key)
+            if handle is not None:
+                handle.cancel()
+            self._forget(room_id, key)
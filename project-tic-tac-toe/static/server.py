@@ -1,150 +1,275 @@
 import socketio
 from aiohttp import web
-import asyncio
 import logging
+import math
+import os
+import re
+import secrets
+
+from board import DEFAULT_SIZE, MAX_SIZE, MIN_SIZE, PLAYER_X, PLAYER_O, valid_size
+from models import Player, Room
+from store import MemoryRoomStore, RedisRoomStore, RoomError, RoomNotFound
+from engine import DEFAULT_TIME_LIMIT, MAX_TIME_LIMIT
+from ai_pool import AIWorkerPool, AIPoolBusy
+from scheduler import RoomScheduler
+from journal import JournalWriter
+from metrics import Metrics, start_queue_logging
+from matchmaking import DEFAULT_RATING, MAX_RATING, Matchmaker, Ticket
+from spectators import SpectatorFeed
+from assets import AssetCache
+from protocol import (MOVE_MADE, GAME_WON, GAME_DRAWN, ProtocolError,
+                      decode_move_request, encode_move_frame)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Set CARO_REDIS_URL to share rooms and broadcasts between several server processes
+REDIS_URL = os.environ.get('CARO_REDIS_URL')
+
+# Set CARO_SOCKET_LOG=1 to log every socket.io/engine.io packet (costly under load)
+SOCKET_LOG = os.environ.get('CARO_SOCKET_LOG') == '1'
+
+# Loggers without handlers of their own, so packet logs only go through the root
+# logger's queue (a bool would make the libraries attach a direct stderr handler)
+socket_logger = logging.getLogger('socketio.server')
+engine_logger = logging.getLogger('engineio.server')
+for packet_logger in (socket_logger, engine_logger):
+    packet_logger.setLevel(logging.INFO if SOCKET_LOG else logging.ERROR)
+
 # Create socket.io server
-sio = socketio.AsyncServer(cors_allowed_origins="*", logger=True, engineio_logger=True)
+client_manager = socketio.AsyncRedisManager(REDIS_URL) if REDIS_URL else None
+sio = socketio.AsyncServer(cors_allowed_origins="*", client_manager=client_manager,
+                           logger=socket_logger, engineio_logger=engine_logger)
 app = web.Application()
 sio.attach(app)
 
+# Handler latencies, connection counts and loop lag, served on /metrics
+metrics = Metrics()
+connected_sockets = metrics.gauge('connected_sockets')
+log_listener = None  # drains the logging queue once the app has started
+
+# Bot searches run in worker processes so they never block the event loop
+ai_pool = AIWorkerPool()
+
 # Game state storage
-rooms = {}  # {room_id: {players: [], board: [], current_turn: 0, game_started: False}}
+store = RedisRoomStore(REDIS_URL) if REDIS_URL else MemoryRoomStore()
+players_by_sid = {}  # {sid: (room_id, player_index)} for clients connected to this process
 
-def create_empty_board():
-    """Create a 15x15 empty board"""
-    return [[None for _ in range(15)] for _ in range(15)]
+# Delayed room events run on loop timers instead of sleeping inside handlers
+scheduler = RoomScheduler()
+GAME_START_DELAY = 1  # seconds between the second player joining and game_start
+RESUME_GRACE = 30  # seconds a dropped player's seat is held for them to resume
 
-def check_winner(board, row, col, symbol):
-    """Check if the last move resulted in a win"""
-    directions = [(0, 1), (1, 0), (1, 1), (1, -1)]  # horizontal, vertical, diagonal
-    
-    for dr, dc in directions:
-        count = 1
-        
-        # Check in positive direction
-        r, c = row + dr, col + dc
-        while 0 <= r < 15 and 0 <= c < 15 and board[r][c] == symbol:
-            count += 1
-            r, c = r + dr, c + dc
-        
-        # Check in negative direction
-        r, c = row - dr, col - dc
-        while 0 <= r < 15 and 0 <= c < 15 and board[r][c] == symbol:
-            count += 1
-            r, c = r - dr, c - dc
-        
-        if count >= 5:
-            return True
-    
-    return False
+# Set CARO_JOURNAL to a file path to record every move (read it back with journal.JournalReader)
+JOURNAL_PATH = os.environ.get('CARO_JOURNAL')
+journal = JournalWriter(JOURNAL_PATH) if JOURNAL_PATH else None
+
+# Quick-match queue, paired in batches on a timer tick
+matchmaker = Matchmaker()
+# Match rooms get ids like the start page's, so they can be typed in to spectate
+ROOM_ID_CHARS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+ROOM_ID_LENGTH = 6
+# Ids clients may create; no ':', so they never clash with spectator shard rooms
+ROOM_ID_PATTERN = re.compile(r'[A-Za-z0-9-]{1,32}')
+
+# Spectators get merged updates in their own socket.io rooms, apart from the players;
+# with Redis, updates go through it to the process each spectator is connected to
+spectators = SpectatorFeed(sio, redis=store.redis if REDIS_URL else None)
 
-def is_board_full(board):
-    """Check if board is full"""
-    return all(cell is not None for row in board for cell in row)
+# Client files are read and compressed once at startup and served from memory
+assets = AssetCache(os.path.dirname(os.path.abspath(__file__)))
 
 @sio.event
-async def connect(sid, environ):
+@metrics.timed
+async def connect(sid, environ, auth=None):
     logger.info(f"Client {sid} connected")
+    connected_sockets.inc()
     await sio.emit('connected', {'message': 'Connected to server'}, to=sid)
 
 @sio.event
-async def disconnect(sid):
+@metrics.timed
+async def disconnect(sid, reason=None):
     logger.info(f"Client {sid} disconnected")
+    connected_sockets.dec()
+    
+    # Drop any bot move still being computed for this client
+    ai_pool.cancel(sid)
+    matchmaker.queue.remove(sid)
+    await spectators.remove(sid, connected=False)
+    
+    entry = players_by_sid.pop(sid, None)
+    if entry is None:
+        return
+    
+    room_id, player_index = entry
+    
+    # A countdown for a game this player was in can no longer start it
+    scheduler.cancel(room_id, 'game_start')
+    
+    def hold_seat(room):
+        # Only a seat facing an opponent is worth holding
+        index = room.player_index(sid, player_index)
+        if index is None or not room.is_full():
+            return None
+        player = room.players[index]
+        player.conn = None
+        return player
+    
+    try:
+        player = await store.update(room_id, hold_seat)
+    except RoomNotFound:
+        return
+    
+    if player is None:
+        await remove_player(room_id, lambda room: room.player_index(sid, player_index))
+        return
+    
+    # Give the player a chance to resume before the seat is given up
+    scheduler.schedule(room_id, f'abandon:{player.token}', RESUME_GRACE, abandon_seat, room_id, player.token)
+    
+    await sio.emit('opponent_disconnected', {
+        'message': f'⏳ {player.name} mất kết nối, đang chờ kết nối lại...'
+    }, room=room_id)
+
+async def leave_lobby(sid):
+    """Withdraw a client taking a seat or watching a room from quick match and from any room it watches"""
+    matchmaker.queue.remove(sid)
+    await spectators.remove(sid)
+
+async def abandon_seat(room_id, token):
+    """Remove a dropped player who did not resume within RESUME_GRACE"""
+    def find_index(room):
+        index = room.token_index(token)
+        if index is None or room.players[index].connected:
+            return None
+        return index
+    
+    await remove_player(room_id, find_index)
+
+async def remove_player(room_id, find_index):
+    """Remove the player at find_index(room) and notify the rest of the room"""
+    def remove(room):
+        index = find_index(room)
+        if index is None:
+            raise RoomError('Player not found in room')
+        room.players.pop(index)
+        return [player.conn for player in room.players]
+    
+    try:
+        remaining = await store.update(room_id, remove)
+    except (RoomNotFound, RoomError):
+        return
+    
+    # Players after the one who left shift down a slot
+    for i, conn in enumerate(remaining):
+        if conn in players_by_sid:
+            players_by_sid[conn] = (room_id, i)
     
-    # Remove player from all rooms
-    for room_id, room in list(rooms.items()):
-        for i, player in enumerate(room['players']):
-            if player['id'] == sid:
-                # Remove player
-                room['players'].pop(i)
-                
-                # Notify remaining players
-                if room['players']:
-                    await sio.emit('player_left', {
-                        'message': f"Đối thủ đã rời khỏi phòng {room_id}",
-                        'room_id': room_id
-                    }, room=room_id)
-                
-                # Clean up empty rooms
-                if not room['players']:
-                    del rooms[room_id]
-                    logger.info(f"Removed empty room {room_id}")
-                
-                break
+    spectators.push(room_id, message=f'Một người chơi đã rời khỏi phòng {room_id}', game_started=False)
+    
+    # Notify remaining players
+    if remaining:
+        await sio.emit('player_left', {
+            'message': f"Đối thủ đã rời khỏi phòng {room_id}",
+            'room_id': room_id
+        }, room=room_id)
+    else:
+        # The store deletes rooms left without players
+        logger.info(f"Removed empty room {room_id}")
 
 @sio.event
+@metrics.timed
 async def create_room(sid, data):
     """Create a new room"""
     try:
         player_name = data.get('player_name', 'Player')
         room_id = data.get('room_id')
+        binary = bool(data.get('binary'))  # client opts in to binary move frames
+        board_size = data.get('board_size', DEFAULT_SIZE)  # 15, 19, ... or 0 for an unbounded board
         
         if not room_id:
             await sio.emit('error', {'message': 'Room ID is required'}, to=sid)
             return
         
-        if room_id in rooms:
-            await sio.emit('error', {'message': f'Room {room_id} already exists'}, to=sid)
+        if not isinstance(room_id, str) or not ROOM_ID_PATTERN.fullmatch(room_id):
+            await sio.emit('error', {'message': 'Room ID may only use letters, digits and -'}, to=sid)
             return
         
+        if not valid_size(board_size):
+            await sio.emit('error', {'message': f'Board size must be 0 (unbounded) or {MIN_SIZE}-{MAX_SIZE}'}, to=sid)
+            return
+        
+        if sid in players_by_sid:
+            await sio.emit('error', {'message': 'Already in a room'}, to=sid)
+            return
+        
+        await leave_lobby(sid)
+        
         # Create new room
-        rooms[room_id] = {
-            'players': [{
-                'id': sid,
-                'name': player_name,
-                'symbol': 'X'
-            }],
-            'board': create_empty_board(),
-            'current_turn': 0,
-            'game_started': False
-        }
+        token = secrets.token_urlsafe(16)
+        room = Room(room_id, board_size)
+        room.players.append(Player(sid, player_name, PLAYER_X, binary, token))
+        
+        if not await store.create(room):
+            await sio.emit('error', {'message': f'Room {room_id} already exists'}, to=sid)
+            return
+        
+        players_by_sid[sid] = (room_id, 0)
         
         await sio.enter_room(sid, room_id)
         
         await sio.emit('room_created', {
             'room_id': room_id,
             'message': f'🏠 Phòng {room_id} đã được tạo! Đang chờ đối thủ...',
-            'symbol': 'X'
+            'symbol': 'X',
+            'resume_token': token,
+            'board_size': board_size
         }, to=sid)
         
-        logger.info(f"Room {room_id} created by {player_name}")
+        logger.info(f"Room {room_id} created by {player_name} with board size {board_size}")
         
     except Exception as e:
         logger.error(f"Error creating room: {e}")
         await sio.emit('error', {'message': 'Failed to create room'}, to=sid)
 
 @sio.event
+@metrics.timed
 async def join_room(sid, data):
     """Join an existing room"""
     try:
         player_name = data.get('player_name', 'Player')
         room_id = data.get('room_id')
+        binary = bool(data.get('binary'))  # client opts in to binary move frames
         
         if not room_id:
             await sio.emit('error', {'message': 'Room ID is required'}, to=sid)
             return
         
-        if room_id not in rooms:
-            await sio.emit('error', {'message': f'Room {room_id} does not exist'}, to=sid)
+        if sid in players_by_sid:
+            await sio.emit('error', {'message': 'Already in a room'}, to=sid)
             return
         
-        room = rooms[room_id]
+        await leave_lobby(sid)
         
-        if len(room['players']) >= 2:
-            await sio.emit('error', {'message': f'Room {room_id} is full'}, to=sid)
+        token = secrets.token_urlsafe(16)
+        
+        def add_player(room):
+            if room.is_full():
+                raise RoomError(f'Room {room_id} is full')
+            room.players.append(Player(sid, player_name, PLAYER_O, binary, token))
+            return room.players[0], len(room.players) - 1, room.board_size
+        
+        try:
+            creator, player_index, board_size = await store.update(room_id, add_player)
+        except RoomNotFound:
+            await sio.emit('error', {'message': f'Room {room_id} does not exist'}, to=sid)
+            return
+        except RoomError as e:
+            await sio.emit('error', {'message': str(e)}, to=sid)
             return
         
-        # Add player to room
-        room['players'].append({
-            'id': sid,
-            'name': player_name,
-            'symbol': 'O'
-        })
+        players_by_sid[sid] = (room_id, player_index)
         
         await sio.enter_room(sid, room_id)
         
@@ -152,176 +277,643 @@ async def join_room(sid, data):
         await sio.emit('room_joined', {
             'room_id': room_id,
             'message': f'🚪 Đã tham gia phòng {room_id}!',
-            'symbol': 'O'
+            'symbol': 'O',
+            'resume_token': token,
+            'board_size': board_size
         }, to=sid)
         
         # Notify the room creator
-        creator = room['players'][0]
         await sio.emit('opponent_joined', {
             'message': f'🎉 {player_name} đã tham gia! Trận đấu sắp bắt đầu...'
-        }, to=creator['id'])
+        }, to=creator.conn)
         
-        # Start the game
-        room['game_started'] = True
+        # Small delay for better UX, without holding this handler
+        scheduler.schedule(room_id, 'game_start', GAME_START_DELAY, start_game, room_id)
         
-        await asyncio.sleep(1)  # Small delay for better UX
+    except Exception as e:
+        logger.error(f"Error joining room: {e}")
+        await sio.emit('error', {'message': 'Failed to join room'}, to=sid)
+
+async def start_game(room_id):
+    """Start the game once the join countdown has run out"""
+    def start(room):
+        if len(room.players) < 2:
+            raise RoomError('Waiting for another player')
+        room.game_started = True
+        return room.players[0], room.players[1], room.game_number, room.board_size
+    
+    try:
+        creator, opponent, game_number, board_size = await store.update(room_id, start)
+    except (RoomNotFound, RoomError):
+        return
+    
+    await announce_start(room_id, creator, opponent, game_number, board_size)
+
+async def announce_start(room_id, creator, opponent, game_number, board_size):
+    message = f'🎮 Trận đấu bắt đầu! {creator.name} (X) đi trước'
+    players = {
+        'X': creator.name,
+        'O': opponent.name
+    }
+    await sio.emit('game_start', {
+        'message': message,
+        'current_player': 'X',
+        'players': players,
+        'game_number': game_number,
+        'board_size': board_size
+    }, room=room_id)
+    
+    spectators.push(room_id, message=message, current_player='X', players=players,
+                    game_number=game_number, board_size=board_size, game_started=True)
+    
+    logger.info(f"Game started in room {room_id}: {creator.name} vs {opponent.name}")
+
+@sio.event
+@metrics.timed
+async def find_match(sid, data):
+    """Queue the player for a quick match against someone of similar rating"""
+    try:
+        player_name = data.get('player_name', 'Player')
+        binary = bool(data.get('binary'))  # client opts in to binary move frames
+        # Ratings are client-supplied and unverified; client.js sends DEFAULT_RATING
+        # until something records game results
+        try:
+            rating = float(data.get('rating', DEFAULT_RATING))
+        except (TypeError, ValueError):
+            rating = math.nan
+        
+        # NaN has no bucket, so only finite ratings get clamped
+        if not math.isfinite(rating):
+            await sio.emit('error', {'message': 'Invalid rating'}, to=sid)
+            return
+        rating = min(max(rating, 0), MAX_RATING)
         
-        await sio.emit('game_start', {
-            'message': f'🎮 Trận đấu bắt đầu! {creator["name"]} (X) đi trước',
-            'current_player': 'X',
-            'players': {
-                'X': creator['name'],
-                'O': player_name
-            }
-        }, room=room_id)
+        if sid in players_by_sid:
+            await sio.emit('error', {'message': 'Already in a room'}, to=sid)
+            return
         
-        logger.info(f"Game started in room {room_id}: {creator['name']} vs {player_name}")
+        matchmaker.queue.add(Ticket(sid, player_name, rating, binary))
+        
+        await sio.emit('match_queued', {
+            'message': '🔍 Đang tìm đối thủ...',
+            'waiting': len(matchmaker.queue)
+        }, to=sid)
         
     except Exception as e:
-        logger.error(f"Error joining room: {e}")
-        await sio.emit('error', {'message': 'Failed to join room'}, to=sid)
+        logger.error(f"Error queueing for a match: {e}")
+        await sio.emit('error', {'message': 'Failed to find a match'}, to=sid)
 
 @sio.event
+@metrics.timed
+async def cancel_match(sid, data=None):
+    """Leave the quick-match queue"""
+    if matchmaker.queue.remove(sid) is not None:
+        await sio.emit('match_cancelled', {'message': 'Đã hủy tìm trận'}, to=sid)
+
+async def start_match(first, second):
+    """Seat a matched pair in a new room and start the game without a countdown"""
+    room = Room(''.join(secrets.choice(ROOM_ID_CHARS) for _ in range(ROOM_ID_LENGTH)))
+    room.players = [
+        Player(first.sid, first.name, PLAYER_X, first.binary, secrets.token_urlsafe(16)),
+        Player(second.sid, second.name, PLAYER_O, second.binary, secrets.token_urlsafe(16))
+    ]
+    room.game_started = True
+    room_id = room.room_id
+    
+    # Both seats are written at once, so nobody can join a half-made room
+    if not await store.create(room):
+        matchmaker.queue.add(first)
+        matchmaker.queue.add(second)
+        return
+    
+    # A player who dropped or took a seat elsewhere while the room was being created
+    # puts the other back in the queue
+    gone = [t for t in (first, second)
+            if t.sid in players_by_sid or not sio.manager.is_connected(t.sid, '/')]
+    if gone:
+        await store.update(room_id, lambda room: room.players.clear())
+        for ticket in (first, second):
+            if ticket not in gone:
+                matchmaker.queue.add(ticket)
+        return
+    
+    for index, (ticket, player) in enumerate(zip((first, second), room.players)):
+        players_by_sid[ticket.sid] = (room_id, index)
+        # Players may watch other games while they wait
+        await spectators.remove(ticket.sid)
+        await sio.enter_room(ticket.sid, room_id)
+        opponent = room.players[1 - index]
+        await sio.emit('match_found', {
+            'room_id': room_id,
+            'symbol': player.symbol,
+            'resume_token': player.token,
+            'opponent': opponent.name,
+            'board_size': room.board_size,
+            'message': f'⚔️ Đã tìm thấy đối thủ: {opponent.name}!'
+        }, to=ticket.sid)
+    
+    await announce_start(room_id, room.players[0], room.players[1], room.game_number, room.board_size)
+    
+    logger.info(f"Matched {first.name} ({first.rating:.0f}) with {second.name} ({second.rating:.0f}) in room {room_id}")
+
+def apply_move(room, sid, player_index, row, col):
+    """Validate and play a move; returns a dict describing the outcome"""
+    player_index = room.player_index(sid, player_index)
+    
+    if player_index is None:
+        raise RoomError('Player not found in room')
+    
+    if not room.game_started:
+        raise RoomError('Game has not started yet')
+    
+    if len(room.players) < 2:
+        raise RoomError('Waiting for another player')
+    
+    # Check if it's player's turn
+    if player_index != room.current_turn:
+        raise RoomError('Not your turn')
+    
+    board = room.board
+    
+    # Check if move is valid
+    if type(row) is not int or type(col) is not int or not board.in_bounds(row, col):
+        raise RoomError('Invalid move position')
+    
+    if not board.is_empty(row, col):
+        raise RoomError('Position already taken')
+    
+    # Make the move
+    player = room.players[player_index]
+    board.place(row, col, player.symbol)
+    
+    result = {
+        'player': player,
+        'next_player': None,
+        'seq': board.move_count,
+        'game_number': room.game_number,
+        'binary_sids': [p.conn for p in room.players if p.binary and p.connected]
+    }
+    
+    # Check for winner
+    if board.check_winner(row, col, player.symbol):
+        room.game_started = False
+        result['outcome'] = 'win'
+    elif board.is_full():
+        room.game_started = False
+        result['outcome'] = 'draw'
+    else:
+        # Continue game - switch turns
+        result['outcome'] = 'move'
+        result['next_player'] = room.next_turn()
+    return result
+
+async def emit_move(room_id, event, payload, frame, binary_sids):
+    """Send a move as a binary frame to clients that negotiated it and as JSON to the rest"""
+    for binary_sid in binary_sids:
+        await sio.emit('move_frame', frame, to=binary_sid)
+    await sio.emit(event, payload, room=room_id, skip_sid=binary_sids or None)
+
+async def play_move(sid, room_id, row, col):
+    """Apply a move sent as JSON or as a binary frame and broadcast the result"""
+    # Find player
+    entry = players_by_sid.get(sid)
+    
+    if entry is None or entry[0] != room_id:
+        await sio.emit('error', {'message': 'Player not found in room'}, to=sid)
+        return
+    
+    try:
+        result = await store.update(room_id, lambda room: apply_move(room, sid, entry[1], row, col))
+    except RoomNotFound:
+        await sio.emit('error', {'message': 'Room not found'}, to=sid)
+        return
+    except RoomError as e:
+        await sio.emit('error', {'message': str(e)}, to=sid)
+        return
+    
+    player = result['player']
+    next_player = result['next_player']
+    symbol = player.symbol
+    seq = result['seq']
+    binary_sids = result['binary_sids']
+    
+    if journal is not None:
+        journal.record(room_id, result['game_number'], seq, row, col, symbol)
+    
+    if result['outcome'] == 'win':
+        # Game over - someone won
+        message = f'🎉 {player.name} ({symbol}) thắng!'
+        await emit_move(room_id, 'game_over', {
+            'winner': player.name,
+            'symbol': symbol,
+            'message': message,
+            'row': row,
+            'col': col,
+            'seq': seq
+        }, encode_move_frame(GAME_WON, row, col, symbol, seq), binary_sids)
+        
+    elif result['outcome'] == 'draw':
+        # Game over - draw
+        message = '🤝 Hòa!'
+        await emit_move(room_id, 'game_over', {
+            'winner': None,
+            'message': message,
+            'row': row,
+            'col': col,
+            'symbol': symbol,
+            'seq': seq
+        }, encode_move_frame(GAME_DRAWN, row, col, symbol, seq), binary_sids)
+        
+    else:
+        message = f'{next_player.name} ({next_player.symbol}) lượt đi'
+        await emit_move(room_id, 'move_made', {
+            'row': row,
+            'col': col,
+            'symbol': symbol,
+            'seq': seq,
+            'current_player': next_player.symbol,
+            'message': message
+        }, encode_move_frame(MOVE_MADE, row, col, symbol, seq, next_player.symbol), binary_sids)
+    
+    # Spectators get this after the players, merged with other moves of the same moment
+    spectators.push(room_id, [[row, col, symbol, seq]], message=message,
+                    current_player=next_player.symbol if next_player else None,
+                    game_started=result['outcome'] == 'move')
+    
+    logger.info(f"Move made in room {room_id}: ({row}, {col}) by {player.name}")
+
+@sio.event
+@metrics.timed
 async def make_move(sid, data):
     """Make a move in the game"""
     try:
-        room_id = data.get('room_id')
-        row = data.get('row')
-        col = data.get('col')
+        await play_move(sid, data.get('room_id'), data.get('row'), data.get('col'))
         
-        if room_id not in rooms:
-            await sio.emit('error', {'message': 'Room not found'}, to=sid)
+    except Exception as e:
+        logger.error(f"Error making move: {e}")
+        await sio.emit('error', {'message': 'Failed to make move'}, to=sid)
+
+@sio.event
+@metrics.timed
+async def move_frame(sid, data):
+    """Make a move sent as a binary frame; the room comes from the sender's seat"""
+    try:
+        row, col = decode_move_request(data)
+        entry = players_by_sid.get(sid)
+        
+        if entry is None:
+            await sio.emit('error', {'message': 'Player not found in room'}, to=sid)
             return
         
-        room = rooms[room_id]
+        await play_move(sid, entry[0], row, col)
+        
+    except ProtocolError as e:
+        await sio.emit('error', {'message': str(e)}, to=sid)
+    except Exception as e:
+        logger.error(f"Error making move: {e}")
+        await sio.emit('error', {'message': 'Failed to make move'}, to=sid)
+
+@sio.event
+@metrics.timed
+async def restart_game(sid, data):
+    """Restart the game in a room"""
+    try:
+        room_id = data.get('room_id')
         
-        # Find player
-        player = None
-        player_index = None
-        for i, p in enumerate(room['players']):
-            if p['id'] == sid:
-                player = p
-                player_index = i
-                break
+        # Only a seated player may restart; spectators and outsiders know room ids too
+        entry = players_by_sid.get(sid)
         
-        if not player:
+        if entry is None or entry[0] != room_id:
             await sio.emit('error', {'message': 'Player not found in room'}, to=sid)
             return
         
-        if not room['game_started']:
-            await sio.emit('error', {'message': 'Game has not started yet'}, to=sid)
-            return
+        def restart(room):
+            if room.player_index(sid, entry[1]) is None:
+                raise RoomError('Player not found in room')
+            
+            if len(room.players) < 2:
+                raise RoomError('Need 2 players to restart')
+            
+            # Reset game state
+            room.reset()
+            room.game_started = True
+            
+            # Swap symbols
+            for player in room.players:
+                player.swap_symbol()
+            
+            return room.players[0], {p.symbol: p.name for p in room.players}, room.game_number
         
-        if len(room['players']) < 2:
-            await sio.emit('error', {'message': 'Waiting for another player'}, to=sid)
+        try:
+            first_player, players, game_number = await store.update(room_id, restart)
+        except RoomNotFound:
+            await sio.emit('error', {'message': 'Room not found'}, to=sid)
             return
-        
-        # Check if it's player's turn
-        if player_index != room['current_turn']:
-            await sio.emit('error', {'message': 'Not your turn'}, to=sid)
+        except RoomError as e:
+            await sio.emit('error', {'message': str(e)}, to=sid)
             return
         
-        # Check if move is valid
-        if row < 0 or row >= 15 or col < 0 or col >= 15:
-            await sio.emit('error', {'message': 'Invalid move position'}, to=sid)
+        message = f'🔄 Chơi lại! {first_player.name} ({first_player.symbol}) đi trước'
+        await sio.emit('game_restarted', {
+            'message': message,
+            'current_player': first_player.symbol,
+            'players': players,
+            'game_number': game_number
+        }, room=room_id)
+        
+        spectators.push(room_id, reset=True, message=message, current_player=first_player.symbol,
+                        players=players, game_number=game_number, game_started=True)
+        
+        logger.info(f"Game restarted in room {room_id}")
+        
+    except Exception as e:
+        logger.error(f"Error restarting game: {e}")
+        await sio.emit('error', {'message': 'Failed to restart game'}, to=sid)
+
+@sio.event
+@metrics.timed
+async def resume(sid, data):
+    """Take a held seat back after a reconnect and send only the moves the client missed"""
+    try:
+        room_id = data.get('room_id')
+        token = data.get('token')
+        last_seq = data.get('last_seq', 0)
+        game_number = data.get('game_number')
+        
+        if not room_id or not token:
+            await sio.emit('resume_failed', {'message': 'Room ID and token are required'}, to=sid)
             return
         
-        if room['board'][row][col] is not None:
-            await sio.emit('error', {'message': 'Position already taken'}, to=sid)
+        if sid in players_by_sid:
+            await sio.emit('error', {'message': 'Already in a room'}, to=sid)
             return
         
-        # Make the move
-        symbol = player['symbol']
-        room['board'][row][col] = symbol
-        
-        # Check for winner
-        if check_winner(room['board'], row, col, symbol):
-            # Game over - someone won
-            await sio.emit('game_over', {
-                'winner': player['name'],
-                'symbol': symbol,
-                'message': f'🎉 {player["name"]} ({symbol}) thắng!',
-                'row': row,
-                'col': col
-            }, room=room_id)
-            
-            # Reset game state
-            room['game_started'] = False
-            
-        elif is_board_full(room['board']):
-            # Game over - draw
-            await sio.emit('game_over', {
-                'winner': None,
-                'message': '🤝 Hòa!',
-                'row': row,
-                'col': col,
-                'symbol': symbol
-            }, room=room_id)
-            
-            # Reset game state
-            room['game_started'] = False
+        await leave_lobby(sid)
+        
+        def reattach(room):
+            index = room.token_index(token)
+            if index is None:
+                raise RoomError('Cannot resume this game')
+            player = room.players[index]
+            old_conn = player.conn
+            player.conn = sid
             
-        else:
-            # Continue game - switch turns
-            room['current_turn'] = 1 - room['current_turn']
-            next_player = room['players'][room['current_turn']]
+            # A log from an earlier game or an unknown seq gets the whole current game
+            since = last_seq
+            if (game_number != room.game_number or not isinstance(since, int)
+                    or not 0 <= since <= room.board.move_count):
+                since = 0
             
-            await sio.emit('move_made', {
-                'row': row,
-                'col': col,
-                'symbol': symbol,
-                'current_player': next_player['symbol'],
-                'message': f'{next_player["name"]} ({next_player["symbol"]}) lượt đi'
-            }, room=room_id)
+            current = room.current_player() if room.is_full() else player
+            return {
+                'index': index,
+                'old_conn': old_conn,
+                'player': player,
+                # The join countdown was cancelled when this player dropped
+                'start': (room.is_full() and not room.game_started and room.board.move_count == 0
+                          and all(p.connected for p in room.players)),
+                'payload': {
+                    'room_id': room_id,
+                    'symbol': player.symbol,
+                    'players': {p.symbol: p.name for p in room.players},
+                    'current_player': current.symbol,
+                    'game_started': room.game_started,
+                    'game_number': room.game_number,
+                    'board_size': room.board_size,
+                    'since': since,
+                    'seq': room.board.move_count,
+                    'moves': room.moves_since(since),
+                    'message': f'🔌 Đã kết nối lại phòng {room_id}!'
+                }
+            }
+        
+        try:
+            result = await store.update(room_id, reattach)
+        except RoomNotFound:
+            await sio.emit('resume_failed', {'message': 'Room not found'}, to=sid)
+            return
+        except RoomError as e:
+            await sio.emit('resume_failed', {'message': str(e)}, to=sid)
+            return
+        
+        # The old connection may not have noticed it dropped yet
+        old_conn = result['old_conn']
+        if old_conn is not None:
+            players_by_sid.pop(old_conn, None)
+            await sio.disconnect(old_conn)
+        
+        player = result['player']
+        players_by_sid[sid] = (room_id, result['index'])
+        scheduler.cancel(room_id, f'abandon:{token}')
+        
+        await sio.enter_room(sid, room_id)
+        await sio.emit('resumed', result['payload'], to=sid)
+        await sio.emit('opponent_resumed', {
+            'message': f'🔌 {player.name} đã kết nối lại!'
+        }, room=room_id, skip_sid=sid)
         
-        logger.info(f"Move made in room {room_id}: ({row}, {col}) by {player['name']}")
+        if result['start']:
+            scheduler.schedule(room_id, 'game_start', GAME_START_DELAY, start_game, room_id)
+        
+        logger.info(f"{player.name} resumed room {room_id} with {len(result['payload']['moves'])} missed moves")
         
     except Exception as e:
-        logger.error(f"Error making move: {e}")
-        await sio.emit('error', {'message': 'Failed to make move'}, to=sid)
+        logger.error(f"Error resuming game: {e}")
+        await sio.emit('error', {'message': 'Failed to resume game'}, to=sid)
 
 @sio.event
-async def restart_game(sid, data):
-    """Restart the game in a room"""
+@metrics.timed
+async def spectate_room(sid, data):
+    """Watch a room: a snapshot now, then merged updates as the game goes on"""
     try:
         room_id = data.get('room_id')
         
-        if room_id not in rooms:
-            await sio.emit('error', {'message': 'Room not found'}, to=sid)
+        if not room_id:
+            await sio.emit('error', {'message': 'Room ID is required'}, to=sid)
             return
         
-        room = rooms[room_id]
+        if sid in players_by_sid:
+            await sio.emit('error', {'message': 'Already in a room'}, to=sid)
+            return
         
-        if len(room['players']) < 2:
-            await sio.emit('error', {'message': 'Need 2 players to restart'}, to=sid)
+        # A mistyped id leaves the room being watched, and the queue, alone
+        if await store.get(room_id) is None:
+            await sio.emit('error', {'message': f'Room {room_id} does not exist'}, to=sid)
             return
         
-        # Reset game state
-        room['board'] = create_empty_board()
-        room['current_turn'] = 0
-        room['game_started'] = True
+        await leave_lobby(sid)
         
-        # Swap symbols
-        for player in room['players']:
-            player['symbol'] = 'O' if player['symbol'] == 'X' else 'X'
+        # A client that disconnected during the lookup has been cleaned up already
+        if not sio.manager.is_connected(sid, '/'):
+            return
         
-        first_player = room['players'][0]
+        # Subscribe before taking the snapshot so no move falls in between;
+        # clients skip moves they already have by seq
+        await spectators.add(sid, room_id)
+        snapshot = await spectator_snapshot(room_id)
         
-        await sio.emit('game_restarted', {
-            'message': f'🔄 Chơi lại! {first_player["name"]} ({first_player["symbol"]}) đi trước',
-            'current_player': first_player['symbol'],
-            'players': {p['symbol']: p['name'] for p in room['players']}
-        }, room=room_id)
+        if snapshot is None:
+            # Closed since the lookup
+            await spectators.remove(sid)
+            await sio.emit('error', {'message': f'Room {room_id} does not exist'}, to=sid)
+            return
         
-        logger.info(f"Game restarted in room {room_id}")
+        await sio.emit('spectating', snapshot, to=sid)
+        
+        logger.info(f"Client {sid} is watching room {room_id} ({spectators.count(room_id)} spectators)")
         
     except Exception as e:
-        logger.error(f"Error restarting game: {e}")
-        await sio.emit('error', {'message': 'Failed to restart game'}, to=sid)
+        logger.error(f"Error spectating room: {e}")
+        await sio.emit('error', {'message': 'Failed to spectate room'}, to=sid)
+
+async def spectator_snapshot(room_id):
+    """Compact state of a room for a new or resynced spectator, or None if it is gone"""
+    room = await store.get(room_id)
+    if room is None:
+        return None
+    return {
+        'room_id': room_id,
+        'players': {p.symbol: p.name for p in room.players},
+        'moves': room.board.moves,
+        'seq': room.board.move_count,
+        'game_number': room.game_number,
+        'board_size': room.board_size,
+        'game_started': room.game_started,
+        'current_player': room.current_player().symbol if room.is_full() else None,
+        'message': f'👀 Đang xem phòng {room_id}'
+    }
+
+@sio.event
+@metrics.timed
+async def request_ai_move(sid, data):
+    """Compute the bot's move for a PVE game"""
+    try:
+        rows = data.get('board')
+        symbol = data.get('symbol', PLAYER_O)
+        try:
+            time_limit = float(data.get('time_limit', DEFAULT_TIME_LIMIT))
+        except (TypeError, ValueError):
+            time_limit = math.nan
+        
+        # NaN or inf would disable every deadline, so only finite positive budgets get clamped
+        if not math.isfinite(time_limit) or time_limit <= 0:
+            await sio.emit('error', {'message': 'Invalid AI time limit'}, to=sid)
+            return
+        time_limit = min(time_limit, MAX_TIME_LIMIT)
+        
+        # Any square board size a room can have; the engine does not play unbounded boards
+        if (symbol not in (PLAYER_X, PLAYER_O) or not isinstance(rows, list)
+                or not MIN_SIZE <= len(rows) <= MAX_SIZE
+                or any(not isinstance(row, list) or len(row) != len(rows) for row in rows)):
+            await sio.emit('error', {'message': 'Invalid AI move request'}, to=sid)
+            return
+        
+        try:
+            result = await ai_pool.request_move(sid, rows, symbol, time_limit)
+        except AIPoolBusy as e:
+            await sio.emit('error', {'message': str(e)}, to=sid)
+            return
+        
+        if result is None:
+            # Deadline passed or the client disconnected
+            await sio.emit('error', {'message': 'AI move timed out'}, to=sid)
+            return
+        
+        if result['row'] is None:
+            await sio.emit('error', {'message': 'No moves left'}, to=sid)
+            return
+        
+        await sio.emit('ai_move', {
+            'row': result['row'],
+            'col': result['col'],
+            'symbol': symbol
+        }, to=sid)
+        
+        logger.info(f"AI move for {sid}: ({result['row']}, {result['col']}) depth {result['depth']}, {result['nodes']} nodes")
+        
+    except Exception as e:
+        logger.error(f"Error computing AI move: {e}")
+        await sio.emit('error', {'message': 'Failed to compute AI move'}, to=sid)
+
+async def start_ai_pool(app):
+    ai_pool.start()
+
+async def stop_ai_pool(app):
+    ai_pool.shutdown()
+
+async def close_store(app):
+    await store.close()
+
+async def start_journal(app):
+    if journal is not None:
+        journal.start()
+
+async def close_journal(app):
+    if journal is not None:
+        await journal.close()
+
+async def start_matchmaker(app):
+    matchmaker.start(start_match)
+
+async def stop_matchmaker(app):
+    await matchmaker.stop()
+
+async def start_spectators(app):
+    spectators.start(spectator_snapshot)
+
+async def stop_spectators(app):
+    await spectators.stop()
+
+async def start_metrics(app):
+    global log_listener
+    metrics.start()
+    # Log records are written by a background thread instead of on the event loop
+    log_listener = start_queue_logging()
+
+async def stop_metrics(app):
+    await metrics.stop()
+    if log_listener is not None:
+        log_listener.stop()
+
+async def metrics_handler(request):
+    """Prometheus scrape endpoint"""
+    body = metrics.render({
+        'active_rooms': await store.count(),
+        'seated_players': len(players_by_sid),
+        'ai_pending_moves': ai_pool.pending_count,
+        'match_queue_size': len(matchmaker.queue),
+        'spectators': len(spectators)
+    })
+    return web.Response(text=body, headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+async def load_assets(app):
+    assets.load()
+
+async def static_handler(request):
+    """Client pages and assets from the in-memory cache"""
+    response = assets.lookup(request.match_info['path'], request.query.get('v'),
+                             request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'))
+    if response is None:
+        raise web.HTTPNotFound()
+    status, headers, body = response
+    return web.Response(status=status, headers=headers, body=body or None)
 
 async def init_app():
     """Initialize the web application"""
-    app.router.add_static('/', path='.')
+    app.on_startup.append(start_ai_pool)
+    app.on_cleanup.append(stop_ai_pool)
+    app.on_cleanup.append(close_store)
+    app.on_startup.append(start_journal)
+    app.on_cleanup.append(close_journal)
+    app.on_startup.append(start_metrics)
+    app.on_cleanup.append(stop_metrics)
+    app.on_startup.append(start_matchmaker)
+    app.on_cleanup.append(stop_matchmaker)
+    app.on_startup.append(start_spectators)
+    app.on_cleanup.append(stop_spectators)
+    app.on_startup.append(load_assets)
+    app.router.add_get('/metrics', metrics_handler)
+    app.router.add_get('/{path:.*}', static_handler)
     return app
 
 if __name__ == '__main__':
@@ -1,10 +1,23 @@
 // Game variables
 let socket = null;
-let board = Array(15).fill().map(() => Array(15).fill(null));
+let boardSize = 15;  // sent by the server for each room; 0 is an unbounded board
+let stones = new Map();  // {"row,col": symbol}, only the placed stones
+let bounds = null;  // {top, left, bottom, right} around the stones
+let view = null;  // {top, left, rows, cols}: the cells drawn in the table
 let mySymbol = null;
 let currentPlayer = 'X';
 let gameStarted = false;
 let roomId = null;
+let playerNames = {};  // {symbol: name}, for messages built from binary frames
+
+// Binary move frames (see protocol.py); set to false to use JSON moves
+const USE_BINARY_MOVES = true;
+const MOVE_REQUEST = 1;
+const MOVE_MADE = 2;
+const GAME_WON = 3;
+const FRAME_SYMBOLS = ['X', 'O'];
+const UNBOUNDED = 0;
+const VIEW_MARGIN = 3;  // empty cells drawn around the stones of an unbounded board
 
 // Get elements
 const boardElement = document.getElementById('board');
@@ -33,26 +46,35 @@ if (gameMode === 'PVP') {
 function connectWebSocket() {
     try {
         socket = new WebSocket('ws://localhost:8001');
+        socket.binaryType = 'arraybuffer';
         
         socket.onopen = function() {
             console.log('Connected to WebSocket server');
             
             if (roomOption === 'create') {
+                const size = parseInt(localStorage.getItem('boardSize'));
                 socket.send(JSON.stringify({
                     action: 'create_room',
                     room_id: roomId,
-                    player_name: playerName
+                    player_name: playerName,
+                    binary: USE_BINARY_MOVES,
+                    board_size: Number.isNaN(size) ? 15 : size
                 }));
             } else if (roomOption === 'join') {
                 socket.send(JSON.stringify({
                     action: 'join_room',
                     room_id: roomId,
-                    player_name: playerName
+                    player_name: playerName,
+                    binary: USE_BINARY_MOVES
                 }));
             }
         };
         
         socket.onmessage = function(event) {
+            if (event.data instanceof ArrayBuffer) {
+                handleMessage(decodeMoveFrame(event.data));
+                return;
+            }
             const data = JSON.parse(event.data);
             handleMessage(data);
         };
@@ -73,15 +95,46 @@ function connectWebSocket() {
     }
 }
 
+function encodeMoveRequest(row, col) {
+    const view = new DataView(new ArrayBuffer(5));
+    view.setUint8(0, MOVE_REQUEST);
+    view.setInt16(1, row);
+    view.setInt16(3, col);
+    return view.buffer;
+}
+
+// Turn a binary frame into the same shape as the JSON messages, text included
+function decodeMoveFrame(buffer) {
+    const view = new DataView(buffer);
+    const data = {
+        type: view.getUint8(0) === MOVE_MADE ? 'move_made' : 'game_over',
+        row: view.getInt16(1),
+        col: view.getInt16(3),
+        symbol: FRAME_SYMBOLS[view.getUint8(5)],
+        seq: view.getUint16(6),
+        current_player: FRAME_SYMBOLS[view.getUint8(8)]
+    };
+    if (data.type === 'move_made') {
+        data.message = `${playerNames[data.current_player]} (${data.current_player}) lượt đi`;
+    } else if (view.getUint8(0) === GAME_WON) {
+        data.message = `🎉 ${playerNames[data.symbol]} (${data.symbol}) thắng!`;
+    } else {
+        data.message = '🤝 Hòa!';
+    }
+    return data;
+}
+
 function handleMessage(data) {
     switch (data.type) {
         case 'room_created':
             mySymbol = data.symbol;
+            setBoardSize(data.board_size);
             status.textContent = data.message;
             break;
             
         case 'room_joined':
             mySymbol = data.symbol;
+            setBoardSize(data.board_size);
             status.textContent = data.message;
             break;
             
@@ -90,13 +143,15 @@ function handleMessage(data) {
             break;
             
         case 'game_start':
+            playerNames = data.players || playerNames;
+            setBoardSize(data.board_size);
             status.textContent = data.message;
             currentPlayer = data.current_player;
             gameStarted = true;
             break;
             
         case 'move_made':
-            board[data.row][data.col] = data.symbol;
+            setStone(data.row, data.col, data.symbol);
             updateBoard();
             currentPlayer = data.current_player;
             status.textContent = data.message;
@@ -104,7 +159,7 @@ function handleMessage(data) {
             
         case 'game_over':
             if (data.row !== undefined && data.col !== undefined) {
-                board[data.row][data.col] = data.symbol;
+                setStone(data.row, data.col, data.symbol);
                 updateBoard();
             }
             status.textContent = data.message;
@@ -122,14 +177,52 @@ function handleMessage(data) {
     }
 }
 
+function stoneKey(row, col) {
+    return `${row},${col}`;
+}
+
+function setStone(row, col, symbol) {
+    stones.set(stoneKey(row, col), symbol);
+    if (!bounds) {
+        bounds = { top: row, left: col, bottom: row, right: col };
+    } else {
+        bounds.top = Math.min(bounds.top, row);
+        bounds.left = Math.min(bounds.left, col);
+        bounds.bottom = Math.max(bounds.bottom, row);
+        bounds.right = Math.max(bounds.right, col);
+    }
+}
+
+function setBoardSize(size) {
+    if (size === undefined || size === boardSize) return;
+    boardSize = size;
+    createBoard();
+}
+
+// The whole board, or for an unbounded board the stones plus a margin (at least 15x15 around the center)
+function boardView() {
+    if (boardSize !== UNBOUNDED) {
+        return { top: 0, left: 0, rows: boardSize, cols: boardSize };
+    }
+    let top = -7, left = -7, bottom = 7, right = 7;
+    if (bounds) {
+        top = Math.min(top, bounds.top - VIEW_MARGIN);
+        left = Math.min(left, bounds.left - VIEW_MARGIN);
+        bottom = Math.max(bottom, bounds.bottom + VIEW_MARGIN);
+        right = Math.max(right, bounds.right + VIEW_MARGIN);
+    }
+    return { top: top, left: left, rows: bottom - top + 1, cols: right - left + 1 };
+}
+
 function createBoard() {
+    view = boardView();
     boardElement.innerHTML = '';
-    for (let i = 0; i < 15; i++) {
+    for (let i = 0; i < view.rows; i++) {
         const row = document.createElement('tr');
-        for (let j = 0; j < 15; j++) {
+        for (let j = 0; j < view.cols; j++) {
             const cell = document.createElement('td');
-            cell.dataset.row = i;
-            cell.dataset.col = j;
+            cell.dataset.row = view.top + i;
+            cell.dataset.col = view.left + j;
             cell.addEventListener('click', handleCellClick);
             row.appendChild(cell);
         }
@@ -156,30 +249,37 @@ function handleCellClick(e) {
     const row = parseInt(e.target.dataset.row);
     const col = parseInt(e.target.dataset.col);
     
-    if (board[row][col]) {
+    if (stones.has(stoneKey(row, col))) {
         status.textContent = 'Ô đã được chọn!';
         return;
     }
     
     // Send move
     if (socket && socket.readyState === WebSocket.OPEN) {
-        socket.send(JSON.stringify({
-            action: 'make_move',
-            room_id: roomId,
-            row: row,
-            col: col
-        }));
+        if (USE_BINARY_MOVES) {
+            socket.send(encodeMoveRequest(row, col));
+        } else {
+            socket.send(JSON.stringify({
+                action: 'make_move',
+                room_id: roomId,
+                row: row,
+                col: col
+            }));
+        }
     }
 }
 
 function updateBoard() {
+    // An unbounded board grows its table when stones come near the edge
+    const next = boardView();
+    if (next.top !== view.top || next.left !== view.left || next.rows !== view.rows || next.cols !== view.cols) {
+        createBoard();
+    }
     const cells = boardElement.getElementsByTagName('td');
-    for (let i = 0; i < 15; i++) {
-        for (let j = 0; j < 15; j++) {
-            const cell = cells[i * 15 + j];
-            cell.textContent = board[i][j] || '';
-            cell.className = board[i][j] ? board[i][j].toLowerCase() : '';
-        }
+    for (let cell of cells) {
+        const symbol = stones.get(stoneKey(cell.dataset.row, cell.dataset.col));
+        cell.textContent = symbol || '';
+        cell.className = symbol ? symbol.toLowerCase() : '';
     }
 }
 
@@ -4,67 +4,152 @@ import websockets
 import json
 import random
 import string
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
 import threading
 import os
+from functools import lru_cache
+
+from board import DEFAULT_SIZE, PLAYER_X, PLAYER_O, valid_size
+from models import Player, Room
+from scheduler import RoomScheduler
+from assets import AssetCache
+from protocol import (MOVE_MADE, GAME_WON, GAME_DRAWN, ProtocolError,
+                      decode_move_request, encode_move_frame)
 
 # Game rooms storage
 rooms = {}
+players_by_ws = {}  # {websocket: (room_id, player_index)}, kept in sync with rooms
+scheduler = RoomScheduler()  # delayed room events, so handlers never sleep
+
+GAME_START_DELAY = 1  # seconds between the second player joining and game_start
+
+SEND_TIMEOUT = 2.0  # seconds one client may take to accept a message before it is dropped
 
 def generate_room_id():
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
 
-def create_board():
-    return [[None for _ in range(15)] for _ in range(15)]
-
-def check_winner(board, row, col, symbol):
-    directions = [(0, 1), (1, 0), (1, 1), (1, -1)]
-    for dr, dc in directions:
-        count = 1
-        # Check positive direction
-        r, c = row + dr, col + dc
-        while 0 <= r < 15 and 0 <= c < 15 and board[r][c] == symbol:
-            count += 1
-            r, c = r + dr, c + dc
-        # Check negative direction
-        r, c = row - dr, col - dc
-        while 0 <= r < 15 and 0 <= c < 15 and board[r][c] == symbol:
-            count += 1
-            r, c = r - dr, c - dc
-        if count >= 5:
-            return True
-    return False
-
-async def handle_websocket(websocket, path):
+@lru_cache(maxsize=1024)
+def encode_error(message):
+    """Error frames are few and repeat a lot, so keep them pre-serialized"""
+    return json.dumps({'type': 'error', 'message': message})
+
+async def send(websocket, message):
+    """Send an already serialized message, giving up on a client that stalls"""
+    try:
+        await asyncio.wait_for(websocket.send(message), SEND_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"Send to {websocket.remote_address} timed out, closing connection")
+        asyncio.ensure_future(websocket.close())
+    except websockets.exceptions.ConnectionClosed:
+        pass
+
+async def broadcast(room, payload):
+    """Serialize payload once and send it to every player in the room concurrently"""
+    message = json.dumps(payload)
+    await asyncio.gather(*(send(player.conn, message) for player in room.players))
+
+async def broadcast_move(room, payload, frame):
+    """Like broadcast, but players that negotiated binary frames get `frame` instead"""
+    message = None
+    sends = []
+    for player in room.players:
+        if player.binary:
+            sends.append(send(player.conn, frame))
+        else:
+            if message is None:
+                message = json.dumps(payload)
+            sends.append(send(player.conn, message))
+    await asyncio.gather(*sends)
+
+async def remove_player(websocket):
+    entry = players_by_ws.pop(websocket, None)
+    if entry is None:
+        return
+    
+    room_id, player_index = entry
+    room = rooms.get(room_id)
+    if room is None:
+        return
+    
+    scheduler.cancel(room_id)
+    room.players.pop(player_index)
+    # Players after the one who left shift down a slot
+    for i in range(player_index, len(room.players)):
+        players_by_ws[room.players[i].conn] = (room_id, i)
+    
+    if not room.players:
+        del rooms[room_id]
+        print(f"Removed empty room {room_id}")
+    else:
+        # Notify remaining player
+        await broadcast(room, {
+            'type': 'player_left',
+            'message': 'Đối thủ đã rời khỏi phòng!'
+        })
+
+async def start_game(room):
+    if len(room.players) < 2:
+        return
+    
+    room.game_started = True
+    creator, opponent = room.players
+    await broadcast(room, {
+        'type': 'game_start',
+        'message': f'🎮 Trận đấu bắt đầu! {creator.name} (X) đi trước',
+        'current_player': 'X',
+        'players': {p.symbol: p.name for p in room.players},
+        'board_size': room.board_size
+    })
+    
+    print(f"Game started in room {room.room_id}: {creator.name} vs {opponent.name}")
+
+async def handle_websocket(websocket, path=None):
     print(f"Client connected: {websocket.remote_address}")
     
     try:
         async for message in websocket:
-            data = json.loads(message)
+            if isinstance(message, bytes):
+                # Binary make_move frame; the room is the sender's own
+                try:
+                    row, col = decode_move_request(message)
+                except ProtocolError:
+                    await send(websocket, encode_error('Nước đi không hợp lệ!'))
+                    continue
+                entry = players_by_ws.get(websocket)
+                data = {'action': 'make_move', 'room_id': entry[0] if entry else None, 'row': row, 'col': col}
+            else:
+                data = json.loads(message)
             action = data.get('action')
             
             if action == 'create_room':
                 room_id = data.get('room_id')
                 player_name = data.get('player_name', 'Player')
+                binary = bool(data.get('binary'))  # client opts in to binary move frames
+                board_size = data.get('board_size', DEFAULT_SIZE)  # 15, 19, ... or 0 for an unbounded board
+                
+                if not valid_size(board_size):
+                    await send(websocket, encode_error('Kích thước bàn cờ không hợp lệ!'))
+                    continue
                 
                 if room_id in rooms:
-                    await websocket.send(json.dumps({
-                        'type': 'error',
-                        'message': f'Phòng {room_id} đã tồn tại!'
-                    }))
+                    await send(websocket, encode_error(f'Phòng {room_id} đã tồn tại!'))
+                    continue
+                
+                if websocket in players_by_ws:
+                    await send(websocket, encode_error('Bạn đã ở trong một phòng!'))
                     continue
                 
-                rooms[room_id] = {
-                    'players': [{'ws': websocket, 'name': player_name, 'symbol': 'X'}],
-                    'board': create_board(),
-                    'current_turn': 0,
-                    'game_started': False
-                }
+                room = Room(room_id, board_size)
+                room.players.append(Player(websocket, player_name, PLAYER_X, binary))
+                rooms[room_id] = room
+                players_by_ws[websocket] = (room_id, 0)
                 
-                await websocket.send(json.dumps({
+                await send(websocket, json.dumps({
                     'type': 'room_created',
                     'room_id': room_id,
                     'symbol': 'X',
+                    'board_size': board_size,
                     'message': f'🏠 Phòng {room_id} đã được tạo! Đang chờ đối thủ...'
                 }))
                 print(f"Room {room_id} created by {player_name}")
@@ -72,51 +157,43 @@ async def handle_websocket(websocket, path):
             elif action == 'join_room':
                 room_id = data.get('room_id')
                 player_name = data.get('player_name', 'Player')
+                binary = bool(data.get('binary'))  # client opts in to binary move frames
                 
                 if room_id not in rooms:
-                    await websocket.send(json.dumps({
-                        'type': 'error',
-                        'message': f'Không tìm thấy phòng {room_id}!'
-                    }))
+                    await send(websocket, encode_error(f'Không tìm thấy phòng {room_id}!'))
                     continue
                 
                 room = rooms[room_id]
-                if len(room['players']) >= 2:
-                    await websocket.send(json.dumps({
-                        'type': 'error',
-                        'message': f'Phòng {room_id} đã đầy!'
-                    }))
+                if room.is_full():
+                    await send(websocket, encode_error(f'Phòng {room_id} đã đầy!'))
+                    continue
+                
+                if websocket in players_by_ws:
+                    await send(websocket, encode_error('Bạn đã ở trong một phòng!'))
                     continue
                 
                 # Add second player
-                room['players'].append({'ws': websocket, 'name': player_name, 'symbol': 'O'})
-                room['game_started'] = True
+                room.players.append(Player(websocket, player_name, PLAYER_O, binary))
+                players_by_ws[websocket] = (room_id, len(room.players) - 1)
                 
                 # Notify joining player
-                await websocket.send(json.dumps({
+                await send(websocket, json.dumps({
                     'type': 'room_joined',
                     'room_id': room_id,
                     'symbol': 'O',
+                    'board_size': room.board_size,
                     'message': f'🚪 Đã tham gia phòng {room_id}!'
                 }))
                 
                 # Notify first player
-                creator = room['players'][0]
-                await creator['ws'].send(json.dumps({
+                creator = room.players[0]
+                await send(creator.conn, json.dumps({
                     'type': 'opponent_joined',
                     'message': f'🎉 {player_name} đã tham gia! Trận đấu sắp bắt đầu...'
                 }))
                 
-                # Start game
-                await asyncio.sleep(1)
-                for player in room['players']:
-                    await player['ws'].send(json.dumps({
-                        'type': 'game_start',
-                        'message': f'🎮 Trận đấu bắt đầu! {creator["name"]} (X) đi trước',
-                        'current_player': 'X'
-                    }))
-                
-                print(f"Game started in room {room_id}: {creator['name']} vs {player_name}")
+                # Start game after a short countdown
+                scheduler.schedule(room_id, 'game_start', GAME_START_DELAY, start_game, room)
             
             elif action == 'make_move':
                 room_id = data.get('room_id')
@@ -124,106 +201,114 @@ async def handle_websocket(websocket, path):
                 col = data.get('col')
                 
                 if room_id not in rooms:
-                    await websocket.send(json.dumps({
-                        'type': 'error',
-                        'message': 'Không tìm thấy phòng!'
-                    }))
+                    await send(websocket, encode_error('Không tìm thấy phòng!'))
                     continue
                 
                 room = rooms[room_id]
                 
                 # Find player
-                player_index = None
-                for i, player in enumerate(room['players']):
-                    if player['ws'] == websocket:
-                        player_index = i
-                        break
-                
-                if player_index is None:
-                    await websocket.send(json.dumps({
-                        'type': 'error',
-                        'message': 'Không tìm thấy người chơi!'
-                    }))
+                entry = players_by_ws.get(websocket)
+                
+                if entry is None or entry[0] != room_id:
+                    await send(websocket, encode_error('Không tìm thấy người chơi!'))
+                    continue
+                
+                if not room.game_started:
+                    await send(websocket, encode_error('Game chưa bắt đầu!'))
                     continue
                 
-                if not room['game_started']:
-                    await websocket.send(json.dumps({
-                        'type': 'error',
-                        'message': 'Game chưa bắt đầu!'
-                    }))
+                player_index = entry[1]
+                if player_index != room.current_turn:
+                    await send(websocket, encode_error('Chưa đến lượt bạn!'))
                     continue
                 
-                if player_index != room['current_turn']:
-                    await websocket.send(json.dumps({
-                        'type': 'error',
-                        'message': 'Chưa đến lượt bạn!'
-                    }))
+                board = room.board
+                # type() rather than isinstance(): JSON true/false would pass as 1/0
+                if type(row) is not int or type(col) is not int or not board.in_bounds(row, col):
+                    await send(websocket, encode_error('Nước đi không hợp lệ!'))
                     continue
                 
-                if room['board'][row][col] is not None:
-                    await websocket.send(json.dumps({
-                        'type': 'error',
-                        'message': 'Ô đã được chọn!'
-                    }))
+                if not board.is_empty(row, col):
+                    await send(websocket, encode_error('Ô đã được chọn!'))
                     continue
                 
                 # Make move
-                player = room['players'][player_index]
-                symbol = player['symbol']
-                room['board'][row][col] = symbol
+                player = room.players[player_index]
+                symbol = player.symbol
+                board.place(row, col, symbol)
                 
                 # Check winner
-                if check_winner(room['board'], row, col, symbol):
+                if board.check_winner(row, col, symbol):
                     # Game over
-                    for p in room['players']:
-                        await p['ws'].send(json.dumps({
-                            'type': 'game_over',
-                            'winner': player['name'],
-                            'symbol': symbol,
-                            'row': row,
-                            'col': col,
-                            'message': f'🎉 {player["name"]} ({symbol}) thắng!'
-                        }))
-                    room['game_started'] = False
+                    room.game_started = False
+                    await broadcast_move(room, {
+                        'type': 'game_over',
+                        'winner': player.name,
+                        'symbol': symbol,
+                        'row': row,
+                        'col': col,
+                        'seq': board.move_count,
+                        'message': f'🎉 {player.name} ({symbol}) thắng!'
+                    }, encode_move_frame(GAME_WON, row, col, symbol, board.move_count))
+                elif board.is_full():
+                    # Draw
+                    room.game_started = False
+                    await broadcast_move(room, {
+                        'type': 'game_over',
+                        'winner': None,
+                        'symbol': symbol,
+                        'row': row,
+                        'col': col,
+                        'seq': board.move_count,
+                        'message': '🤝 Hòa!'
+                    }, encode_move_frame(GAME_DRAWN, row, col, symbol, board.move_count))
                 else:
                     # Continue game
-                    room['current_turn'] = 1 - room['current_turn']
-                    next_player = room['players'][room['current_turn']]
+                    next_player = room.next_turn()
                     
-                    for p in room['players']:
-                        await p['ws'].send(json.dumps({
-                            'type': 'move_made',
-                            'row': row,
-                            'col': col,
-                            'symbol': symbol,
-                            'current_player': next_player['symbol'],
-                            'message': f'{next_player["name"]} ({next_player["symbol"]}) lượt đi'
-                        }))
-                
-                print(f"Move in room {room_id}: ({row}, {col}) by {player['name']}")
+                    await broadcast_move(room, {
+                        'type': 'move_made',
+                        'row': row,
+                        'col': col,
+                        'symbol': symbol,
+                        'seq': board.move_count,
+                        'current_player': next_player.symbol,
+                        'message': f'{next_player.name} ({next_player.symbol}) lượt đi'
+                    }, encode_move_frame(MOVE_MADE, row, col, symbol, board.move_count, next_player.symbol))
+                
+                print(f"Move in room {room_id}: ({row}, {col}) by {player.name}")
     
     except websockets.exceptions.ConnectionClosed:
         print(f"Client disconnected: {websocket.remote_address}")
-        # Remove player from rooms
-        for room_id, room in list(rooms.items()):
-            for i, player in enumerate(room['players']):
-                if player['ws'] == websocket:
-                    room['players'].pop(i)
-                    if not room['players']:
-                        del rooms[room_id]
-                        print(f"Removed empty room {room_id}")
-                    else:
-                        # Notify remaining player
-                        for p in room['players']:
-                            await p['ws'].send(json.dumps({
-                                'type': 'player_left',
-                                'message': 'Đối thủ đã rời khỏi phòng!'
-                            }))
-                    break
+    finally:
+        # Remove player from their room, also on a clean close
+        await remove_player(websocket)
+
+class AssetHandler(BaseHTTPRequestHandler):
+    """Serves the client files from an AssetCache, with ETags and compression"""
+    assets = AssetCache(os.path.dirname(os.path.abspath(__file__)))
+
+    def do_GET(self, head=False):
+        url = urlsplit(self.path)
+        response = self.assets.lookup(url.path, parse_qs(url.query).get('v', [None])[0],
+                                      self.headers.get('Accept-Encoding'), self.headers.get('If-None-Match'))
+        if response is None:
+            self.send_error(404)
+            return
+        status, headers, body = response
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
 
 def start_http_server():
-    os.chdir('/workspace/project-tic-tac-toe/static')
-    httpd = HTTPServer(('localhost', 8000), SimpleHTTPRequestHandler)
+    AssetHandler.assets.load()
+    httpd = ThreadingHTTPServer(('localhost', 8000), AssetHandler)
     print("HTTP Server running on http://localhost:8000")
     httpd.serve_forever()
 
@@ -0,0 +1,239 @@
+"""Spectator fan-out: coalesced room updates sent to sharded socket.io rooms, off the players' path."""
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 0.1  # seconds of moves merged into one spectator update
+SHARD_SIZE = 500  # spectators per socket.io room; shards are sent one after another
+MAX_BACKLOG = 32  # packets queued for a spectator before they count as slow
+SWEEP_INTERVAL = 1.0  # seconds between slow-spectator checks
+SWEEP_BATCH = 1000  # spectators checked before yielding to other handlers
+CHANNEL = 'caro:spectators:{}'  # Redis channel carrying one room's updates between server processes
+
+
+class SpectatorFeed:
+    """Spectators of each room, split over shard rooms ``<room_id>:spectators:<n>``.
+
+    Spectators never join the players' own socket.io room, so player
+    broadcasts do not grow with the audience. ``push`` merges room changes
+    into one pending update per room that is sent FLUSH_INTERVAL later, one
+    shard at a time. A sweep detaches spectators whose engine.io send queue
+    backs up, so they stop receiving updates, and sends them a fresh snapshot
+    from ``snapshot(room_id)`` once the queue has drained.
+
+    With a ``redis`` client, rooms are shared by several processes and a
+    room's spectators may be connected to any of them. Updates are then
+    published on the room's own CHANNEL, which a process subscribes to only
+    while some of its clients watch that room, so nodes never receive moves
+    of rooms nobody there is watching.
+    """
+
+    def __init__(self, sio, flush_interval=FLUSH_INTERVAL, shard_size=SHARD_SIZE, max_backlog=MAX_BACKLOG,
+                 redis=None, channel=CHANNEL):
+        self.sio = sio
+        self.flush_interval = flush_interval
+        self.shard_size = shard_size
+        self.max_backlog = max_backlog
+        self.rooms = {}  # {room_id: [set of sids, one per shard]}
+        self.watching = {}  # {sid: (room_id, shard)}
+        self.lagging = {}  # {sid: room_id}, detached until their queue drains
+        self.pending = {}  # {room_id: update being merged}
+        self.tasks = set()
+        self.snapshot = None
+        self.sweeper = None
+        self.redis = redis
+        self.channel = channel
+        self.pubsub = None
+        self.subscribed = asyncio.Event()  # set while the pubsub has any room channel
+        self.listener = None
+
+    def __len__(self):
+        return len(self.watching) + len(self.lagging)
+
+    def shard_room(self, room_id, shard):
+        return f'{room_id}:spectators:{shard}'
+
+    async def add(self, sid, room_id):
+        """Start sending room_id's updates to sid; callers check sid is still connected first"""
+        new_room = room_id not in self.rooms
+        shards = self.rooms.setdefault(room_id, [])
+        shard = next((i for i, members in enumerate(shards) if len(members) < self.shard_size), None)
+        if shard is None:
+            shard = len(shards)
+            shards.append(set())
+        # Registered before any await, so a disconnect meanwhile still finds it in remove()
+        shards[shard].add(sid)
+        self.watching[sid] = (room_id, shard)
+        await self.sio.enter_room(sid, self.shard_room(room_id, shard))
+        if new_room:
+            await self._subscribe(room_id)
+
+    async def remove(self, sid, connected=True):
+        """Stop sending to sid; pass connected=False from disconnect, when socket.io already dropped it"""
+        self.lagging.pop(sid, None)
+        entry = self.watching.pop(sid, None)
+        if entry is None:
+            return
+        room_id, shard = entry
+        shards = self.rooms[room_id]
+        shards[shard].discard(sid)
+        if not any(shards):
+            del self.rooms[room_id]
+            await self._unsubscribe(room_id)
+        if connected:
+            await self.sio.leave_room(sid, self.shard_room(room_id, shard))
+
+    def count(self, room_id):
+        return sum(len(members) for members in self.rooms.get(room_id, ()))
+
+    def room_channel(self, room_id):
+        return self.channel.format(room_id)
+
+    async def _subscribe(self, room_id):
+        if self.pubsub is None:
+            return
+        try:
+            await self.pubsub.subscribe(self.room_channel(room_id))
+            self.subscribed.set()
+        except Exception as e:
+            # The listener resubscribes every watched room when it reconnects
+            logger.error(f"Failed to subscribe to spectator updates for room {room_id}: {e}")
+
+    async def _unsubscribe(self, room_id):
+        if self.pubsub is None:
+            return
+        try:
+            await self.pubsub.unsubscribe(self.room_channel(room_id))
+        except Exception as e:
+            logger.error(f"Failed to unsubscribe from spectator updates for room {room_id}: {e}")
+
+    def push(self, room_id, moves=(), reset=False, **state):
+        """Merge moves ([row, col, symbol, seq] lists) and state fields into the room's next update.
+
+        ``reset`` means the board was cleared (a restart), so moves merged
+        before it are dropped and spectators clear their board first.
+        """
+        # Shared rooms may be watched through another process
+        if self.redis is None and room_id not in self.rooms:
+            return
+        update = self.pending.get(room_id)
+        if update is None:
+            update = self.pending[room_id] = {'room_id': room_id, 'moves': []}
+            asyncio.get_running_loop().call_later(self.flush_interval, self._flush, room_id)
+        if reset:
+            update['reset'] = True
+            update['moves'] = []
+        update['moves'].extend(moves)
+        update.update(state)
+
+    def _flush(self, room_id):
+        update = self.pending.pop(room_id, None)
+        if update is not None:
+            if self.redis is not None:
+                self._spawn(self._publish(update))
+            else:
+                self._spawn(self._fan_out(room_id, update))
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _publish(self, update):
+        try:
+            # Redis drops it at once when no process is watching the room
+            await self.redis.publish(self.room_channel(update['room_id']), json.dumps(update))
+        except Exception as e:
+            logger.error(f"Failed to publish spectator update for room {update['room_id']}: {e}")
+
+    async def _listen(self):
+        while True:
+            self.pubsub = self.redis.pubsub()
+            try:
+                rooms = list(self.rooms)
+                if rooms:
+                    await self.pubsub.subscribe(*map(self.room_channel, rooms))
+                    self.subscribed.set()
+                while True:
+                    if not self.pubsub.subscribed:
+                        # Reading needs a subscription; wait for the first watched room
+                        self.subscribed.clear()
+                        await self.subscribed.wait()
+                        continue
+                    message = await self.pubsub.get_message(ignore_subscribe_messages=True,
+                                                            timeout=SWEEP_INTERVAL)
+                    if message is None or message['type'] != 'message':
+                        continue
+                    update = json.loads(message['data'])
+                    if update['room_id'] in self.rooms:
+                        self._spawn(self._fan_out(update['room_id'], update))
+            except Exception as e:
+                logger.error(f"Spectator update listener failed: {e}")
+            finally:
+                pubsub, self.pubsub = self.pubsub, None
+                await pubsub.aclose()
+            await asyncio.sleep(SWEEP_INTERVAL)
+
+    async def _fan_out(self, room_id, update):
+        # One shard per emit, so a huge audience is sent in slices between player events.
+        # Shards only hold this process's spectators, so the emit skips the Redis manager.
+        for shard in range(len(self.rooms.get(room_id, ()))):
+            await self.sio.emit('spectator_update', update, room=self.shard_room(room_id, shard),
+                                ignore_queue=True)
+            await asyncio.sleep(0)
+
+    def backlog(self, sid):
+        """Packets waiting in the engine.io queue of sid"""
+        eio_sid = self.sio.manager.eio_sid_from_sid(sid, '/')
+        socket = self.sio.eio.sockets.get(eio_sid) if eio_sid else None
+        return socket.queue.qsize() if socket is not None else 0
+
+    def start(self, snapshot):
+        """Start the sweep and any Redis listener; snapshot(room_id) is a coroutine returning a snapshot or None"""
+        self.snapshot = snapshot
+        loop = asyncio.get_running_loop()
+        self.sweeper = loop.create_task(self._sweep())
+        if self.redis is not None:
+            self.listener = loop.create_task(self._listen())
+
+    async def stop(self):
+        for task in (self.sweeper, self.listener):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.sweeper = self.listener = None
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            try:
+                await self._detach_slow()
+                await self._resync_drained()
+            except Exception as e:
+                logger.error(f"Spectator sweep failed: {e}")
+
+    async def _detach_slow(self):
+        for i, (sid, (room_id, shard)) in enumerate(list(self.watching.items())):
+            if i and i % SWEEP_BATCH == 0:
+                await asyncio.sleep(0)
+            if sid in self.watching and self.backlog(sid) > self.max_backlog:
+                await self.remove(sid)
+                self.lagging[sid] = room_id
+
+    async def _resync_drained(self):
+        for sid, room_id in list(self.lagging.items()):
+            if self.lagging.get(sid) != room_id or self.backlog(sid) > 0:
+                continue
+            del self.lagging[sid]
+            snapshot = await self.snapshot(room_id)
+            # The spectator may have disconnected while the snapshot was read
+            if snapshot is None or not self.sio.manager.is_connected(sid, '/'):
+                continue
+            # Rejoin first; moves also in the snapshot are skipped by seq on the client
+            await self.add(sid, room_id)
+            await self.sio.emit('spectating', snapshot, to=sid)
@@ -0,0 +1,132 @@
+"""Room storage backends: in-process dict or a shared Redis-compatible server."""
+import json
+from abc import ABC, abstractmethod
+
+from models import Room
+
+
+class RoomNotFound(KeyError):
+    pass
+
+
+class RoomError(Exception):
+    """Raised by an update function to reject a change; nothing is saved"""
+
+
+class RoomStore(ABC):
+    """Interface the socket handlers use for room state.
+
+    ``update(room_id, mutate)`` is the only way to change a stored room: it
+    loads the room, calls ``mutate(room)`` and saves the result atomically,
+    retrying if another process changed the room in between. A room left
+    with no players is deleted instead of saved. ``mutate`` must be a plain
+    function that validates before it changes anything, and its return value
+    is passed back to the caller.
+    """
+
+    @abstractmethod
+    async def get(self, room_id):
+        pass
+
+    @abstractmethod
+    async def create(self, room):
+        """Store a new room; returns False if the room id is taken"""
+
+    @abstractmethod
+    async def update(self, room_id, mutate):
+        pass
+
+    @abstractmethod
+    async def count(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class MemoryRoomStore(RoomStore):
+    """Rooms kept as live objects in this process (single worker only)"""
+
+    def __init__(self):
+        self.rooms = {}  # {room_id: Room}
+
+    async def get(self, room_id):
+        return self.rooms.get(room_id)
+
+    async def create(self, room):
+        if room.room_id in self.rooms:
+            return False
+        self.rooms[room.room_id] = room
+        return True
+
+    async def update(self, room_id, mutate):
+        room = self.rooms.get(room_id)
+        if room is None:
+            raise RoomNotFound(room_id)
+        result = mutate(room)
+        if not room.players:
+            del self.rooms[room_id]
+        return result
+
+    async def count(self):
+        return len(self.rooms)
+
+
+class RedisRoomStore(RoomStore):
+    """Rooms serialized as JSON in Redis so several server processes can share them.
+
+    Updates use WATCH/MULTI optimistic transactions. ``client`` may be any
+    redis.asyncio-compatible client (fakeredis works for local testing).
+    """
+
+    def __init__(self, url=None, client=None, prefix='caro:'):
+        if client is None:
+            import redis.asyncio
+            client = redis.asyncio.from_url(url)
+        self.redis = client
+        self.prefix = prefix
+        self.index_key = f'{prefix}rooms'  # set of room ids, for count()
+
+    def key(self, room_id):
+        return f'{self.prefix}room:{room_id}'
+
+    async def get(self, room_id):
+        raw = await self.redis.get(self.key(room_id))
+        return Room.from_dict(json.loads(raw)) if raw is not None else None
+
+    async def create(self, room):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self.key(room.room_id), json.dumps(room.to_dict()), nx=True)
+            pipe.sadd(self.index_key, room.room_id)
+            created, _ = await pipe.execute()
+        return bool(created)
+
+    async def update(self, room_id, mutate):
+        from redis.exceptions import WatchError
+
+        key = self.key(room_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    if raw is None:
+                        raise RoomNotFound(room_id)
+                    room = Room.from_dict(json.loads(raw))
+                    result = mutate(room)
+                    pipe.multi()
+                    if room.players:
+                        pipe.set(key, json.dumps(room.to_dict()))
+                    else:
+                        pipe.delete(key)
+                        pipe.srem(self.index_key, room_id)
+                    await pipe.execute()
+                    return result
+                except WatchError:
+                    continue
+
+    async def count(self):
+        return await self.redis.scard(self.index_key)
+
+    async def close(self):
+        await self.redis.aclose()
@@ -0,0 +1,169 @@
+"""Incremental index of 5-cell line segments used by the AI evaluator."""
+from board import DIRECTIONS, PLAYER_X, PLAYER_O
+
+WIN_SCORE = 10_000_000
+WINDOW_SCORES = [0, 1, 10, 100, 1000, WIN_SCORE]  # by stones in a live 5-cell window
+CANDIDATE_RADIUS = 2  # only consider empty cells this close to a stone
+
+_segments_cache = {}  # {size: (windows, cell_windows)}
+_neighbours_cache = {}  # {size: neighbours}
+
+
+def line_segments(size):
+    """Every run of 5 cells on the board in all four directions.
+
+    Returns (windows, cell_windows): windows[w] lists the cell indexes
+    (row * size + col) of segment w, cell_windows[i] lists the segments that
+    contain cell i.
+    """
+    if size not in _segments_cache:
+        windows = []
+        cell_windows = [[] for _ in range(size * size)]
+        for row in range(size):
+            for col in range(size):
+                for dr, dc in DIRECTIONS:
+                    end_r, end_c = row + 4 * dr, col + 4 * dc
+                    if not (0 <= end_r < size and 0 <= end_c < size):
+                        continue
+                    cells = [(row + i * dr) * size + col + i * dc for i in range(5)]
+                    for index in cells:
+                        cell_windows[index].append(len(windows))
+                    windows.append(cells)
+        _segments_cache[size] = (windows, cell_windows)
+    return _segments_cache[size]
+
+
+def cell_neighbours(size):
+    """neighbours[i] lists the cells within CANDIDATE_RADIUS of cell i, itself excluded"""
+    if size not in _neighbours_cache:
+        span = range(-CANDIDATE_RADIUS, CANDIDATE_RADIUS + 1)
+        _neighbours_cache[size] = [
+            [(row + dr) * size + col + dc for dr in span for dc in span
+             if (dr or dc) and 0 <= row + dr < size and 0 <= col + dc < size]
+            for row in range(size) for col in range(size)
+        ]
+    return _neighbours_cache[size]
+
+
+class ThreatIndex:
+    """Per-board stone counts for every line segment, updated one move at a time.
+
+    A segment is live for a side while the other side has no stone in it.
+    ``score`` sums WINDOW_SCORES over each side's live segments, ``fours`` and
+    ``threes`` hold the live segments with 4 and 3 stones. Placing or removing
+    a stone only touches the (at most 20) segments through that cell.
+
+    ``candidates`` is the set of empty cells within CANDIDATE_RADIUS of a
+    stone. ``near`` counts the stones around each cell, so a move updates at
+    most 24 neighbours instead of rescanning every stone.
+    """
+
+    __slots__ = ('size', 'windows', 'cell_windows', 'neighbours', 'cells', 'counts', 'score', 'fours', 'threes',
+                 'near', 'candidates')
+
+    def __init__(self, size):
+        self.size = size
+        self.windows, self.cell_windows = line_segments(size)
+        self.neighbours = cell_neighbours(size)
+        self.clear()
+
+    @classmethod
+    def from_board(cls, board):
+        index = cls(board.size)
+        for row, col, symbol in board.moves:
+            index.add(row * board.size + col, symbol)
+        return index
+
+    def clear(self):
+        count = len(self.windows)
+        self.cells = bytearray(self.size * self.size)  # 0 empty, 1 X, 2 O
+        self.counts = {PLAYER_X: [0] * count, PLAYER_O: [0] * count}
+        self.score = {PLAYER_X: 0, PLAYER_O: 0}
+        self.fours = {PLAYER_X: set(), PLAYER_O: set()}
+        self.threes = {PLAYER_X: set(), PLAYER_O: set()}
+        self.near = [0] * (self.size * self.size)  # stones within CANDIDATE_RADIUS of each cell
+        self.candidates = set()
+
+    def _retrack(self, symbol, window, old, new):
+        if old == 3:
+            self.threes[symbol].discard(window)
+        elif old == 4:
+            self.fours[symbol].discard(window)
+        if new == 3:
+            self.threes[symbol].add(window)
+        elif new == 4:
+            self.fours[symbol].add(window)
+
+    def add(self, index, symbol):
+        """Record a stone placed on cell index"""
+        other = PLAYER_O if symbol == PLAYER_X else PLAYER_X
+        mine, theirs = self.counts[symbol], self.counts[other]
+        self.cells[index] = 1 if symbol == PLAYER_X else 2
+        self._add_neighbours(index)
+        for w in self.cell_windows[index]:
+            m, t = mine[w], theirs[w]
+            mine[w] = m + 1
+            if t == 0:
+                self.score[symbol] += WINDOW_SCORES[m + 1] - WINDOW_SCORES[m]
+                self._retrack(symbol, w, m, m + 1)
+            elif m == 0:
+                # Segment was live for the opponent and is now blocked
+                self.score[other] -= WINDOW_SCORES[t]
+                self._retrack(other, w, t, 0)
+
+    def remove(self, index, symbol):
+        """Record a stone taken back from cell index"""
+        other = PLAYER_O if symbol == PLAYER_X else PLAYER_X
+        mine, theirs = self.counts[symbol], self.counts[other]
+        self.cells[index] = 0
+        self._remove_neighbours(index)
+        for w in self.cell_windows[index]:
+            m, t = mine[w], theirs[w]
+            mine[w] = m - 1
+            if t == 0:
+                self.score[symbol] += WINDOW_SCORES[m - 1] - WINDOW_SCORES[m]
+                self._retrack(symbol, w, m, m - 1)
+            elif m == 1:
+                # Segment is live for the opponent again
+                self.score[other] += WINDOW_SCORES[t]
+                self._retrack(other, w, 0, t)
+
+    def _add_neighbours(self, index):
+        near, cells, candidates = self.near, self.cells, self.candidates
+        candidates.discard(index)
+        for n in self.neighbours[index]:
+            near[n] += 1
+            if not cells[n]:
+                candidates.add(n)
+
+    def _remove_neighbours(self, index):
+        near, candidates = self.near, self.candidates
+        for n in self.neighbours[index]:
+            near[n] -= 1
+            if not near[n]:
+                candidates.discard(n)
+        if near[index]:
+            candidates.add(index)
+
+    def _empty_cells(self, windows):
+        cells = self.cells
+        return {i for w in windows for i in self.windows[w] if not cells[i]}
+
+    def winning_cells(self, symbol):
+        """Empty cells that complete five for symbol (the opponent's defending cells)"""
+        return self._empty_cells(self.fours[symbol])
+
+    def three_cells(self, symbol):
+        """Empty cells that turn one of symbol's threes into a four"""
+        return self._empty_cells(self.threes[symbol])
+
+    def cell_value(self, index, symbol):
+        """Score gained by symbol for a stone on cell index"""
+        mine = self.counts[symbol]
+        theirs = self.counts[PLAYER_O if symbol == PLAYER_X else PLAYER_X]
+        value = 0
+        for w in self.cell_windows[index]:
+            if not theirs[w]:
+                m = mine[w]
+                value += WINDOW_SCORES[m + 1] - WINDOW_SCORES[m]
+        return value
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Headless self-play tournaments between engine configurations.
+
+Plays round-robin games on the 15x15 board with the server's rules
+(Board.check_winner), spread over a process pool, streams one JSON line per
+finished game and prints Elo, win-rate and speed tables.
+
+    python tournament.py fast:time=0.05,depth=3 deep:time=0.5,depth=6 --games 100
+    python tournament.py --report results.jsonl --budget 0.5
+
+An engine is ``name:option=value,...`` with options ``time`` (seconds per
+move), ``depth`` (max search depth) and ``kind`` (``search``, or ``random``
+for a baseline that plays random cells next to the stones).
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from board import Board, PLAYER_X, PLAYER_O
+from engine import DEFAULT_MAX_DEPTH, DEFAULT_TIME_LIMIT, MAX_TIME_LIMIT, Search, TranspositionTable, find_best_move
+
+DEFAULT_ENGINES = ['random:kind=random', 'quick:time=0.05,depth=2', 'default:time=0.2,depth=4']
+OPENING_MOVES = 2  # random moves near the center before the engines take over, so games differ
+TABLE_ENTRIES = 50_000  # transposition table size per side and game
+ELO_BASE = 1500  # average rating of the field
+
+
+def parse_engine(spec):
+    """'name:time=0.1,depth=4' -> {'name': ..., 'kind': ..., 'time': ..., 'depth': ...}"""
+    name, _, options = spec.partition(':')
+    engine = {'name': name, 'kind': 'search', 'time': DEFAULT_TIME_LIMIT, 'depth': DEFAULT_MAX_DEPTH}
+    for option in filter(None, options.split(',')):
+        key, _, value = option.partition('=')
+        if key == 'time':
+            engine['time'] = min(float(value), MAX_TIME_LIMIT)
+        elif key == 'depth':
+            engine['depth'] = int(value)
+        elif key == 'kind' and value in ('search', 'random'):
+            engine['kind'] = value
+        else:
+            raise ValueError(f'Unknown engine option {option!r} in {spec!r}')
+    return engine
+
+
+def random_opening(board, rng, count):
+    center = board.size // 2
+    symbol = PLAYER_X
+    while board.move_count < count:
+        row, col = center + rng.randint(-2, 2), center + rng.randint(-2, 2)
+        if board.is_empty(row, col):
+            board.place(row, col, symbol)
+            symbol = PLAYER_O if symbol == PLAYER_X else PLAYER_X
+    return [[row, col, symbol] for row, col, symbol in board.moves]
+
+
+def play_game(game_id, x_engine, o_engine, seed, opening=OPENING_MOVES):
+    """Play one game in a worker process and return its result record"""
+    rng = random.Random(seed)
+    board = Board()
+    opening_moves = random_opening(board, rng, opening)
+    engines = {PLAYER_X: x_engine, PLAYER_O: o_engine}
+    tables = {PLAYER_X: TranspositionTable(TABLE_ENTRIES), PLAYER_O: TranspositionTable(TABLE_ENTRIES)}
+    stats = {symbol: {'moves': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'nodes': 0, 'depth': 0, 'times': []}
+             for symbol in engines}
+
+    symbol = PLAYER_X if board.move_count % 2 == 0 else PLAYER_O
+    winner = None
+    while not board.is_full():
+        engine = engines[symbol]
+        started = time.perf_counter()
+        if engine['kind'] == 'random':
+            row, col = rng.choice(sorted(Search(board, 0, 0, tables[symbol]).candidates()))
+            nodes = depth = 0
+        else:
+            result = find_best_move(board, symbol, engine['time'], engine['depth'], tables[symbol])
+            row, col, nodes, depth = result['row'], result['col'], result['nodes'], result['depth']
+        elapsed = time.perf_counter() - started
+
+        side = stats[symbol]
+        side['moves'] += 1
+        side['seconds'] += elapsed
+        side['max_seconds'] = max(side['max_seconds'], elapsed)
+        side['nodes'] += nodes
+        side['depth'] += depth
+        side['times'].append(round(elapsed, 5))
+
+        board.place(row, col, symbol)
+        if board.check_winner(row, col, symbol):
+            winner = symbol
+            break
+        symbol = PLAYER_O if symbol == PLAYER_X else PLAYER_X
+
+    return {
+        'game': game_id,
+        'x': x_engine['name'],
+        'o': o_engine['name'],
+        'winner': winner,
+        'moves': board.move_count,
+        'opening': opening_moves,
+        'stats': {engines[s]['name']: side for s, side in stats.items()},
+        'engines': {PLAYER_X: x_engine, PLAYER_O: o_engine}
+    }
+
+
+def schedule(engines, games_per_pair, seed):
+    """Round-robin games, each pairing played from both sides in turn"""
+    rng = random.Random(seed)
+    games = []
+    for i, first in enumerate(engines):
+        for second in engines[i + 1:]:
+            for n in range(games_per_pair):
+                x, o = (first, second) if n % 2 == 0 else (second, first)
+                games.append((len(games), x, o, rng.getrandbits(32)))
+    return games
+
+
+def fit_elo(results, iterations=200):
+    """Bradley-Terry ratings by minorization-maximization, draws counting half.
+
+    Every engine also gets one virtual draw against an average opponent so
+    engines that never (or always) win keep a finite rating. Ratings are
+    shifted so the field averages ELO_BASE.
+    """
+    names = sorted({r['x'] for r in results} | {r['o'] for r in results})
+    if not names:
+        return {}
+    score = defaultdict(float)
+    pairs = defaultdict(int)  # {(a, b): games}
+    for r in results:
+        x, o = r['x'], r['o']
+        pairs[(x, o)] += 1
+        pairs[(o, x)] += 1
+        if r['winner'] == PLAYER_X:
+            score[x] += 1
+        elif r['winner'] == PLAYER_O:
+            score[o] += 1
+        else:
+            score[x] += 0.5
+            score[o] += 0.5
+
+    strength = {name: 1.0 for name in names}
+    for _ in range(iterations):
+        updated = {}
+        for name in names:
+            denominator = 1 / (strength[name] + 1.0)  # the virtual average opponent
+            for other in names:
+                games = pairs.get((name, other))
+                if games:
+                    denominator += games / (strength[name] + strength[other])
+            updated[name] = (score[name] + 0.5) / denominator
+        strength = updated
+
+    elo = {name: 400 * math.log10(value) for name, value in strength.items()}
+    shift = ELO_BASE - sum(elo.values()) / len(elo)
+    return {name: value + shift for name, value in elo.items()}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def summarize(results):
+    """Per-engine totals: score, win/draw/loss and move timing"""
+    summary = {}
+
+    def entry(name):
+        if name not in summary:
+            summary[name] = {'games': 0, 'wins': 0, 'draws': 0, 'losses': 0, 'moves': 0,
+                             'seconds': 0.0, 'nodes': 0, 'depth': 0, 'times': []}
+        return summary[name]
+
+    head_to_head = defaultdict(lambda: [0.0, 0])  # {(a, b): [score of a, games]}
+    for r in results:
+        for symbol, name, other in ((PLAYER_X, r['x'], r['o']), (PLAYER_O, r['o'], r['x'])):
+            e = entry(name)
+            e['games'] += 1
+            if r['winner'] is None:
+                e['draws'] += 1
+                points = 0.5
+            elif r['winner'] == symbol:
+                e['wins'] += 1
+                points = 1.0
+            else:
+                e['losses'] += 1
+                points = 0.0
+            head_to_head[(name, other)][0] += points
+            head_to_head[(name, other)][1] += 1
+
+            stats = r['stats'][name]
+            e['moves'] += stats['moves']
+            e['seconds'] += stats['seconds']
+            e['nodes'] += stats['nodes']
+            e['depth'] += stats['depth']
+            e['times'].extend(stats['times'])
+    return summary, head_to_head
+
+
+def print_report(results, budget=None):
+    summary, head_to_head = summarize(results)
+    elo = fit_elo(results)
+    names = sorted(summary, key=lambda name: -elo.get(name, 0))
+
+    print(f"{len(results)} games\n")
+    print(f"{'engine':<16}{'elo':>7}{'games':>7}{'win%':>7}{'draw%':>7}{'score%':>8}"
+          f"{'ms/move':>9}{'p99 ms':>9}{'max ms':>9}{'depth':>7}{'nodes/s':>10}")
+    for name in names:
+        e = summary[name]
+        games = e['games'] or 1
+        moves = e['moves'] or 1
+        p99 = percentile(e['times'], 99)
+        over = ' over budget' if budget is not None and p99 > budget else ''
+        print(f"{name:<16}{elo[name]:>7.0f}{e['games']:>7}{100 * e['wins'] / games:>7.1f}"
+              f"{100 * e['draws'] / games:>7.1f}{100 * (e['wins'] + e['draws'] / 2) / games:>8.1f}"
+              f"{1000 * e['seconds'] / moves:>9.1f}{1000 * p99:>9.1f}{1000 * max(e['times'], default=0):>9.1f}"
+              f"{e['depth'] / moves:>7.2f}{e['nodes'] / e['seconds'] if e['seconds'] else 0:>10.0f}{over}")
+
+    print("\nscore% of row engine against column engine")
+    print(f"{'':<16}" + ''.join(f"{name[:9]:>10}" for name in names))
+    for name in names:
+        cells = []
+        for other in names:
+            points, games = head_to_head.get((name, other), (0, 0))
+            cells.append(f"{100 * points / games:>10.1f}" if games else f"{'-':>10}")
+        print(f"{name:<16}" + ''.join(cells))
+
+
+def load_results(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Self-play tournament between engine configurations')
+    parser.add_argument('engines', nargs='*', help='name:time=SECONDS,depth=N,kind=search|random')
+    parser.add_argument('--games', type=int, default=20, help='games per pair of engines')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--output', default='tournament.jsonl', help='file receiving one JSON line per game')
+    parser.add_argument('--opening', type=int, default=OPENING_MOVES, help='random opening moves per game')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--budget', type=float, help='seconds per move; flags engines whose p99 exceeds it')
+    parser.add_argument('--report', metavar='FILE', help='only print the tables for an existing results file')
+    args = parser.parse_args()
+
+    if args.report:
+        print_report(load_results(args.report), args.budget)
+        return
+
+    engines = [parse_engine(spec) for spec in (args.engines or DEFAULT_ENGINES)]
+    if len({e['name'] for e in engines}) != len(engines) or len(engines) < 2:
+        parser.error('give at least two engines with different names')
+
+    games = schedule(engines, args.games, args.seed)
+    results = []
+    started = time.perf_counter()
+    with open(args.output, 'w') as out, ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(play_game, game_id, x, o, seed, args.opening) for game_id, x, o, seed in games]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+            print(f"\r{done}/{len(games)} games", end='', file=sys.stderr, flush=True)
+    print(f"\rplayed {len(games)} games in {time.perf_counter() - started:.1f}s with {args.workers} workers",
+          file=sys.stderr)
+
+    print_report(results, args.budget)
+
+
+if __name__ == '__main__':
+    main()